@@ -16,6 +16,11 @@ if not os.getenv("RIOT_API_KEY"):
 # ---------------------------------------------------------------------
 from app.routes import health, wrapped, account, verification, admin
 from app.services.riot_fetcher import cache
+from app.services import cache_dynamo
+from app.services.ddragon import champions
+from app.services.http_client import http
+from app.services.cache import init_cache
+from app.services.jobs import batches, jobs
 
 
 # ---------------------------------------------------------------------
@@ -51,11 +56,21 @@ async def periodic_cache_cleanup():
 @app.on_event("startup")
 async def on_startup():
     print("🚀 LOL Wrapped API starting up...")
+    init_cache()
+    await http.start()
+    jobs.start()
+    await champions.start()
     asyncio.create_task(periodic_cache_cleanup())
 
 @app.on_event("shutdown")
 async def on_shutdown():
     print("🛑 LOL Wrapped API shutting down...")
+    await batches.stop()
+    await jobs.stop()
+    await champions.stop()
+    await http.stop()
+    await asyncio.to_thread(cache.flush)
+    await asyncio.to_thread(cache_dynamo.flush)
 
 # ---------------------------------------------------------------------
 # Root route
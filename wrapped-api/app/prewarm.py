@@ -0,0 +1,81 @@
+"""
+Pre-warm wrapped results from the command line.
+
+    python -m app.prewarm players.txt --region na1
+    python -m app.prewarm --from-cache 10 --region na1
+
+`players.txt` holds one Riot ID (name#tag) or PUUID per line ("-" reads stdin).
+--from-cache adds every PUUID with more than N cached matches (what /admin/cache lists).
+Runs the same batch as POST /wrapped/prewarm, in this process.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+if not os.getenv("RIOT_API_KEY"):
+    raise SystemExit("❌ RIOT_API_KEY not found. Check your .env file in the project root.")
+
+from app.routes.wrapped import prewarm_players
+from app.services import cache_dynamo
+from app.services.cache import init_cache
+from app.services.ddragon import champions
+from app.services.http_client import http
+from app.services.jobs import jobs
+from app.services.riot_fetcher import cache
+
+
+def cached_players(more_than: int) -> list[str]:
+    if not cache.participants_ready.is_set():
+        print("[PREWARM] ⏳ Waiting for the participant index to finish building...")
+        cache.participants_ready.wait()
+    out = []
+    while True:
+        total, page = cache.participant_counts(more_than + 1, limit=1000, offset=len(out))
+        out += [p["puuid"] for p in page]
+        if not page or len(out) >= total:
+            return out
+
+
+def read_players(path: str) -> list[str]:
+    f = sys.stdin if path == "-" else open(path)
+    with f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+async def main(args):
+    players = []
+    for path in args.files:
+        players += read_players(path)
+    init_cache()
+    if args.from_cache is not None:
+        players += cached_players(args.from_cache)
+    if not players:
+        raise SystemExit("No players given.")
+
+    await http.start()
+    jobs.start()
+    await champions.start()
+    try:
+        report = await prewarm_players(players, args.region, args.refresh)
+    finally:
+        await jobs.stop()
+        await champions.stop()
+        await http.stop()
+        await asyncio.to_thread(cache.flush)
+        await asyncio.to_thread(cache_dynamo.flush)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Pre-compute and cache wrapped results for a list of players.")
+    ap.add_argument("files", nargs="*", help="Files with one Riot ID (name#tag) or PUUID per line; - for stdin")
+    ap.add_argument("--from-cache", type=int, metavar="N", help="Also include PUUIDs with more than N cached matches")
+    ap.add_argument("--region", default="na1")
+    ap.add_argument("--refresh", action="store_true", help="Rebuild players that already have a fresh result")
+    asyncio.run(main(ap.parse_args()))
@@ -1,57 +1,100 @@
+import random
 import sqlite3
-import json
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
 from fastapi.responses import JSONResponse
 
+from app.services import cache_codecs, cache_dynamo
+from app.services.ddragon import champions
+from app.services.hot_cache import hot
+from app.services.http_client import http
+from app.services.rate_limiter import limiter
+from app.services.riot_fetcher import cache
+from app.services.singleflight import flights
+
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
 DB_PATH = "cache.db"
 
 @router.get("/cache")
-def inspect_cache():
+def inspect_cache(
+    min_matches: int = Query(11, ge=1, description="Only players with at least this many cached matches."),
+    queue: int | None = Query(None, description="Only count matches of this queueId (e.g. 420 for ranked solo)."),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+):
     """
-    Inspect current cache.db contents.
-    Summarizes all cached match data by PUUID.
-    Returns: list of {puuid, num_matches, example_match}
-    (Filtered to only players with >10 matches)
+    Summarize cached match data by PUUID, most cached matches first.
+    Served from the participant index (no match payload is decoded).
+    Returns: one page of {puuid, num_matches, example_match, last_end_ts}
+    plus the total number of eligible players. While an upgraded database is
+    still being indexed, `index.status` is "building" and counts are partial.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+    total, players = cache.participant_counts(min_matches, queue, limit, offset)
+    return JSONResponse({
+        "cached_players": players,
+        "total_eligible_players": total,
+        "limit": limit,
+        "offset": offset,
+        "index": dict(cache.backfill),
+    })
+
+
+def _sample_rows(conn: sqlite3.Connection, prefix: str, n: int) -> list[tuple]:
+    """Up to n random (data, codec) rows under a key prefix, by probing random rowids (no full sort)."""
+    lo, hi = conn.execute("SELECT MIN(rowid), MAX(rowid) FROM cache").fetchone()
+    if lo is None:
+        return []
+    end = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    rows = {}
+    for _ in range(n * 3):
+        if len(rows) >= n:
+            break
+        # +key keeps the planner on the rowid b-tree instead of the key index
+        row = conn.execute(
+            "SELECT rowid, data, codec FROM cache WHERE rowid >= ? AND +key >= ? AND +key < ? ORDER BY rowid LIMIT 1",
+            (random.randint(lo, hi), prefix, end),
+        ).fetchone()
+        if row:
+            rows[row[0]] = row[1:]
+    return list(rows.values())
+
 
-    cur.execute("SELECT key, data FROM cache")
-    rows = cur.fetchall()
+@router.get("/cache/codecs")
+def cache_codec_report(sample: int = Query(50, ge=1, le=1000)):
+    """
+    Size and decode-time report for every available cache codec, measured on a
+    random sample of cached match and timeline payloads.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    report = {}
+    for prefix in ("match:", "timeline:"):
+        rows = _sample_rows(conn, prefix, sample)
+        stored_bytes = sum(len(data) for data, _ in rows)
+        payloads = [cache_codecs.decode(codec, data) for data, codec in rows]
+        report[prefix.rstrip(":")] = {
+            "samples": len(payloads),
+            "stored_bytes": stored_bytes,
+            "write_codec": cache_codecs.for_key(prefix).name,
+            "codecs": cache_codecs.benchmark(payloads) if payloads else {},
+        }
     conn.close()
+    return JSONResponse(report)
 
-    summary = {}
-    for key, data in rows:
-        if not key.startswith("match:"):
-            continue
-
-        try:
-            match_json = json.loads(data)
-            participants = match_json.get("metadata", {}).get("participants", [])
-            match_id = key.split(":")[1]
-
-            for puuid in participants:
-                if puuid not in summary:
-                    summary[puuid] = {
-                        "num_matches": 0,
-                        "example_match": match_id
-                    }
-                summary[puuid]["num_matches"] += 1
-
-        except Exception:
-            continue
-
-    # ✅ filter PUUIDs with > 10 matches
-    filtered = [
-        {"puuid": puuid, **info}
-        for puuid, info in summary.items()
-        if info["num_matches"] > 10
-    ]
 
+@router.get("/stats")
+def runtime_stats():
+    """
+    In-process counters for the Riot call path:
+    single-flight coalescing, rate limiter activity, the response cache,
+    the in-process hot tier, the DynamoDB write-behind queue, the
+    loaded DDragon patch and the shared HTTP connection pool.
+    """
     return JSONResponse({
-        "cached_players": filtered,
-        "total_eligible_players": len(filtered)
+        "singleflight": flights.snapshot(),
+        "rate_limiter": dict(limiter.stats),
+        "cache": cache.stats(),
+        "hot_cache": hot.snapshot(),
+        "dynamo": cache_dynamo.snapshot(),
+        "ddragon": champions.snapshot(),
+        "http": http.snapshot(),
     })
-
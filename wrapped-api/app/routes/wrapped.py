@@ -1,7 +1,10 @@
 import asyncio
+import hashlib
 import json
+import os
 import time
 from datetime import datetime
+from typing import Literal
 
 from app.services import (
     aggregator,
@@ -12,20 +15,42 @@ from app.services import (
     riot_api,
     riot_fetcher,
 )
-from app.services.account_api import get_account_by_riot_id
+from app.services.account_api import BASE_URL as ACCOUNT_BASE_URL, get_account_by_puuid, get_account_by_riot_id
+from app.services.hot_cache import invalidate_wrapped
+from app.services.jobs import batches, jobs
+from app.services.rate_limiter import host_key, limiter
 from app.utils.player_metrics import compute_additional_player_metrics
 from app.utils.player_roast_summary import build_player_data
 from app.utils.wrapped_formatter import process_wrapped_output
-from fastapi import APIRouter, HTTPException, Path, Query
+from fastapi import APIRouter, Body, HTTPException, Path, Query, Request
 from fastapi.responses import JSONResponse
 
 router = APIRouter(prefix="/wrapped", tags=["Wrapped"])
 
+# How long a cached wrapped is served before new games are folded in
+WRAPPED_REFRESH_INTERVAL = int(os.getenv("WRAPPED_REFRESH_INTERVAL", 6 * 3600))
+# Pre-warm batches only start a new player while the region's Riot app budget
+# is below this share, leaving the rest for interactive requests
+PREWARM_MAX_BUDGET = float(os.getenv("PREWARM_MAX_BUDGET", 0.8))
+PREWARM_MAX_PLAYERS = int(os.getenv("PREWARM_MAX_PLAYERS", 5000))
+# Wrapped workers a batch may occupy at once; by default all but one, so user
+# requests never queue behind a full set of pre-warm builds
+PREWARM_CONCURRENCY = int(os.getenv("PREWARM_CONCURRENCY", 0)) or max(1, jobs.workers - 1)
+
 
 def log(msg: str):
     print(f"[{datetime.now().strftime('%H:%M:%S')}] [WRAPPED] {msg}")
 
 
+async def _timed(timings: dict, name: str, coro):
+    """Await `coro`, recording its wall time under timings[name]."""
+    t = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[name] = time.perf_counter() - t
+
+
 async def generate_wrapped(
     region: str,
     puuid: str,
@@ -33,9 +58,28 @@ async def generate_wrapped(
     end: str | None = None,
     summoner_name: str = None,
     count: int | None = None,
+    previous: dict | None = None,
+    detail: str = "full",
+    progress: dict | None = None,
 ):
+    """
+    Build the wrapped summary for a player.
+
+    `previous` is a stored wrapped state (see cache.get_wrapped_state); when given,
+    only matches that started after its last game are fetched and the new rows are
+    folded in front of the stored ones.
+
+    `detail="fast"` skips timeline fetches for matches not already parsed, so
+    timeline-only fields (dragon subtypes, elders, shutdowns) are unavailable for them.
+
+    `progress` (when given) is updated in place with the current stage and
+    fetched/parsed/total match counts, for job status polling.
+    """
+    progress = progress if progress is not None else {}
     start_ts = riot_api.to_unix(start)
     end_ts = riot_api.to_unix(end) if end else int(time.time())
+    if previous:
+        start_ts = max(start_ts, previous["last_end_ts"] // 1000)
 
     log(f"▶️ Starting wrapped generation for PUUID={puuid} (region={region})")
     log(f"Fetching data from {start} → {end or 'now'} (limit={count or 'full year'})")
@@ -43,82 +87,134 @@ async def generate_wrapped(
     platform_region = riot_api.cluster_to_region(region)
     cluster = riot_api.region_to_cluster(platform_region)
 
-    async with riot_api.session_ctx() as session:
-        # 1️⃣ Load champion metadata
-        log("Fetching latest DDragon patch info...")
-        patch = await ddragon.get_latest_patch(session)
-        log(f"✔️ Patch {patch} loaded. Fetching champion data...")
-        champ_data, key_to_name = await ddragon.get_champions(session, patch)
-        log(f"✔️ Loaded {len(champ_data)} champion entries.")
-
-        # 2️⃣ Get match history
-        log(f"Fetching match IDs from cluster {cluster}...")
-        match_ids = await riot_api.fetch_match_ids(
-            session, cluster, puuid, start_ts, end_ts, count or 9999
-        )
-        log(f"✔️ Retrieved {len(match_ids)} match IDs.")
+    timings = {}
+    t0 = time.perf_counter()
 
-        if not match_ids:
-            raise HTTPException(
-                status_code=404, detail="No matches found for this player."
+    async with riot_api.session_ctx() as session:
+        # Dependency graph:
+        #   ddragon ─────────────────────────────┐
+        #   match ids ═▶ matches ──▶ aggregate ──┼──▶ champion / best-champion analytics
+        #   profile (mastery, summoner, rank) ───┘
+        # Everything without an arrow between it runs concurrently; ═▶ is streamed
+        # (matches start fetching while later ID pages are still being listed).
+        async def profile():
+            mastery, summoner_info, summoner_rank = await asyncio.gather(
+                riot_api.fetch_champion_mastery(
+                    session, region if region != "americas" else "na1", puuid
+                ),
+                riot_api.fetch_summoner_by_puuid(session, platform_region, puuid),
+                riot_api.fetch_rank_by_puuid(session, platform_region, puuid),
+            )
+            return mastery, summoner_info, summoner_rank
+
+        ddragon_task = asyncio.create_task(_timed(timings, "ddragon", ddragon.champions.ensure_loaded()))
+        profile_task = asyncio.create_task(_timed(timings, "profile", profile()))
+        try:
+            # 1️⃣ + 2️⃣ Page match history and stream matches: each page of IDs starts
+            # fetching as soon as it arrives, each match is parsed as soon as it lands
+            progress.update(stage="fetching_matches", total=0, fetched=0, parsed=0)
+            log(f"⚡ Streaming match IDs from cluster {cluster} into the match fetcher...")
+            known = set(previous["match_ids"]) if previous else set()
+            order = {}
+
+            async def id_batches():
+                t = time.perf_counter()
+                async for batch in riot_api.iter_indexed_match_ids(
+                    session, cluster, puuid, start_ts, end_ts, count
+                ):
+                    new_ids = []
+                    for key, mid in batch:
+                        if mid not in known:
+                            order[mid] = key
+                            new_ids.append(mid)
+                    progress["total"] += len(new_ids)
+                    if new_ids:
+                        yield new_ids
+                timings["match_ids"] = time.perf_counter() - t
+
+            t_matches = time.perf_counter()
+            parsed = []
+            async for match_id, data in riot_fetcher.stream_matches(
+                cluster, id_batches(), puuid, include_timeline=(detail == "full"), session=session
+            ):
+                progress["fetched"] += 1
+                if isinstance(data, Exception):
+                    log(f"⚠️ Match {match_id} failed to fetch: {data}")
+                    continue
+
+                if data:
+                    parsed.append((order[match_id], match_id, data))
+                    progress["parsed"] += 1
+                    log(
+                        f"   ↳ Parsed match {match_id} (Kills={data.get('kills')}, Win={data.get('win')})"
+                    )
+                else:
+                    log(f"   ⚠️ Skipped match {match_id} (no participant data found)")
+            timings["matches"] = time.perf_counter() - t_matches
+
+            # pin indexed matches to their real end time (listing windows are approximate)
+            await asyncio.to_thread(
+                cache.set_match_index_times,
+                puuid,
+                {mid: data["end_ts"] // 1000 for _, mid, data in parsed if data.get("end_ts")},
             )
 
-        # 3️⃣ Fetch and parse matches (optimized)
-        log(f"⚡ Fetching {len(match_ids)} matches concurrently with caching...")
-
-        # Fetch all matches + timelines concurrently (with rate limiting)
-        fetched = await riot_fetcher.fetch_matches_concurrent(
-            cluster, match_ids, include_timeline=True
-        )
-
-        results = []
-        for idx, item in enumerate(fetched, start=1):
-            if isinstance(item, Exception):
-                log(f"⚠️ Match {match_ids[idx - 1]} failed to fetch: {item}")
-                continue
-
-            match, timeline = item
-            data = parser.extract_stats(match, timeline, puuid)
-            if data:
-                results.append(data)
-                log(
-                    f"   ↳ Parsed match {match_ids[idx - 1]} (Kills={data.get('kills')}, Win={data.get('win')})"
-                )
+            if previous:
+                log(f"✔️ Retrieved {len(order)} new match IDs since last refresh.")
             else:
-                log(
-                    f"   ⚠️ Skipped match {match_ids[idx - 1]} (no participant data found)"
-                )
+                log(f"✔️ Retrieved {len(order)} match IDs.")
 
-        # 4️⃣ Aggregate stats
-        log("Aggregating global and monthly stats...")
-        global_summary, monthly_trends, monthly_activity = aggregator.aggregate_global(
-            results
-        )
-
-        if summoner_name:
-            global_summary["SummonerName"] = summoner_name
+            if not order and not previous:
+                raise HTTPException(
+                    status_code=404, detail="No matches found for this player."
+                )
 
-        log("Computing champion/role analytics...")
-        champ_role_summary = aggregator.champion_role_analytics(results, champ_data)
+            # Restore match-history order (streaks and tie-breaks depend on it)
+            parsed.sort(key=lambda x: x[0])
+            results = [data for _, _, data in parsed]
+            result_ids = [mid for _, mid, _ in parsed]
+
+            if previous:
+                # stored rows are older than anything just fetched
+                results += previous["rows"]
+                result_ids += previous["match_ids"]
+
+            # 3️⃣ Aggregate stats
+            progress["stage"] = "aggregating"
+            log("Aggregating global and monthly stats...")
+            t_agg = time.perf_counter()
+            agg_state = aggregator.build_state(results)
+            global_summary, monthly_trends, monthly_activity = aggregator.finalize_global(
+                agg_state
+            )
 
-        log("Fetching champion mastery info...")
-        mastery = await riot_api.fetch_champion_mastery(
-            session, region if region != "americas" else "na1", puuid
-        )
+            timings["aggregate"] = time.perf_counter() - t_agg
 
-        summoner_info = await riot_api.fetch_summoner_by_puuid(
-            session, platform_region, puuid
-        )
-        summoner_level = summoner_info["summonerLevel"]
+            if summoner_name:
+                global_summary["SummonerName"] = summoner_name
 
-        summoner_rank = await riot_api.fetch_rank_by_puuid(
-            session, platform_region, puuid
-        )
+            # 4️⃣ Join with champion metadata and the profile lookups
+            progress["stage"] = "fetching_profile"
+            await ddragon_task
+            patch, champ_data, key_to_name = ddragon.champions.current()
+            log(f"Computing champion/role analytics (patch {patch})...")
+            champ_role_summary = aggregator.finalize_champion_roles(agg_state, champ_data)
 
-        best_champs = aggregator.best_champions_with_mastery(
-            results, mastery, key_to_name
-        )
+            mastery, summoner_info, summoner_rank = await profile_task
+            summoner_level = summoner_info["summonerLevel"]
 
+            best_champs = aggregator.finalize_best_champions(
+                agg_state, mastery, key_to_name
+            )
+        finally:
+            # on an early exit (e.g. no matches) don't leave side lookups running or unobserved
+            for task in (ddragon_task, profile_task):
+                task.cancel()
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    timings["total"] = time.perf_counter() - t0
+    progress["timings"] = {k: round(v, 3) for k, v in timings.items()}
+    log("⏱️ Stage timings: " + ", ".join(f"{k}={v:.2f}s" for k, v in timings.items()))
     log("✅ Wrapped generation complete!")
     log("------------------------------------------------------------")
 
@@ -128,6 +224,7 @@ async def generate_wrapped(
             "puuid": puuid,
             "patch": patch,
             "summonerName": summoner_name,
+            "detail": detail,
         },
         "global_summary": global_summary,
         "monthly_activity": monthly_activity,
@@ -136,25 +233,304 @@ async def generate_wrapped(
         "best_champions": best_champs,
         "summoner_level": summoner_level,
         "raw_matches": results,
+        "match_ids": result_ids,
+    }
+
+
+async def build_wrapped(
+    puuid: str,
+    name: str,
+    region: str,
+    count: int | None = None,
+    previous: dict | None = None,
+    detail: str = "full",
+    progress: dict | None = None,
+):
+    """Generate + format a wrapped result; complete (full-detail, uncapped) results are persisted."""
+    cluster = riot_api.region_to_cluster(region)
+    log(f"Using cluster: {cluster} (detail={detail})")
+
+    summary = await generate_wrapped(
+        cluster,
+        puuid,
+        summoner_name=name,
+        count=count,
+        previous=previous,
+        detail=detail,
+        progress=progress,
+    )
+
+    extra_stats = compute_additional_player_metrics(summary["raw_matches"])
+    summary["extra_stats"] = extra_stats
+
+    formatted = process_wrapped_output(summary)
+    roast_summary = build_player_data(summary, formatted)
+
+    formatted["roast_summary"] = roast_summary
+    # formatted["summary"] = summary
+
+    # ✅ Cache complete results only: fast ones get backfilled, and a count-capped
+    # state would pass for the season and keep later refreshes from ever
+    # fetching the games it left out
+    if detail == "full" and not count:
+        invalidate_wrapped(puuid, "2025")
+        await asyncio.to_thread(
+            cache.set_wrapped_state, puuid, "2025", parser.PARSER_VERSION,
+            summary["match_ids"], summary["raw_matches"],
+        )
+        # write-behind: returns as soon as the item is queued
+        cache_dynamo.put_cached_wrapped(
+            puuid, formatted, "2025", region, roast_summary=roast_summary
+        )
+
+    return formatted
+
+
+def submit_wrapped_job(
+    puuid: str, name: str, region: str, count: int | None = None, season: str = "2025"
+):
+    """Queue a full-detail build for (puuid, season), or attach to the one already running."""
+    # count-capped builds aren't persisted, so uncapped requests mustn't attach to them
+    key = (puuid, season) if not count else (puuid, season, count)
+    return jobs.submit(key, _build_on_state, puuid, name, region, count, season)
+
+
+async def _build_on_state(puuid: str, name: str, region: str, count: int | None, season: str,
+                          progress: dict | None = None):
+    """Job body: fold new games into the stored state as of when the job starts."""
+    # a count-capped build covers only its last `count` games, not the stored season;
+    # a state from another parser version is rebuilt from scratch
+    state = None
+    if not count:
+        state = await asyncio.to_thread(cache.get_wrapped_state, puuid, season, parser.PARSER_VERSION)
+    return await build_wrapped(puuid, name, region, count, previous=state, progress=progress)
+
+
+async def _budget_headroom(host: str):
+    """Wait until `host`'s Riot app budget is below PREWARM_MAX_BUDGET."""
+    while limiter.utilization(host) >= PREWARM_MAX_BUDGET:
+        await asyncio.sleep(1)
+
+
+async def _resolve_players(players: list[str]) -> tuple[list[tuple[str, str]], dict]:
+    """Riot IDs ("name#tag") and PUUIDs -> ([(puuid, name)], {entry: error})."""
+    resolved, failed = {}, {}
+    account_host = host_key(ACCOUNT_BASE_URL)
+    for entry in dict.fromkeys(p.strip() for p in players if p.strip()):
+        # lookups are one at a time and yield to user traffic on the account-v1 host
+        await _budget_headroom(account_host)
+        try:
+            if "#" in entry:
+                name, _, tag = entry.rpartition("#")
+                account = await get_account_by_riot_id(name, tag)
+                resolved[account["puuid"]] = name
+            else:
+                # the name is baked into the stored result, so PUUIDs need theirs too
+                account = await get_account_by_puuid(entry)
+                resolved[account["puuid"]] = account["gameName"]
+        except Exception as e:
+            failed[entry] = str(e)
+    return list(resolved.items()), failed
+
+
+async def prewarm_players(
+    players: list[str],
+    region: str = "na1",
+    refresh: bool = False,
+    progress: dict | None = None,
+):
+    """Build and cache wrapped results for players ahead of demand, most-parsed first; returns a throughput report."""
+    progress = progress if progress is not None else {}
+    t0 = time.perf_counter()
+    calls_before = limiter.stats["requests"]
+    cluster = riot_api.region_to_cluster(region)
+
+    progress.update(stage="resolving", total=len(players), generated=0, skipped=0, failed=0)
+    resolved, failed = await _resolve_players(players)
+    shared = await asyncio.to_thread(
+        cache.count_parsed_matches, [p for p, _ in resolved], parser.PARSER_VERSION
+    )
+    resolved.sort(key=lambda p: shared.get(p[0], 0), reverse=True)
+    progress.update(stage="generating", total=len(resolved), failed=len(failed))
+    log(f"🔥 Pre-warming {len(resolved)} players ({len(failed)} unresolved, {len(shared)} with parsed matches)")
+
+    running: dict[asyncio.Future, str] = {}
+
+    async def reap(return_when):
+        done, _ = await asyncio.wait(running, return_when=return_when)
+        for fut in done:
+            puuid = running.pop(fut)
+            if fut.cancelled() or fut.exception():
+                failed[puuid] = "cancelled" if fut.cancelled() else str(fut.exception())
+                progress["failed"] += 1
+            else:
+                progress["generated"] += 1
+
+    for puuid, name in resolved:
+        if not refresh:
+            # straight from DynamoDB: don't fill the hot tier with payloads nobody asked for
+            updated_at, state = await asyncio.gather(
+                asyncio.to_thread(cache_dynamo.get_wrapped_updated_at, puuid, "2025"),
+                asyncio.to_thread(cache.get_wrapped_state, puuid, "2025", parser.PARSER_VERSION),
+            )
+            if _is_fresh(updated_at, state):
+                progress["skipped"] += 1
+                continue
+        while len(running) >= PREWARM_CONCURRENCY:
+            await reap(asyncio.FIRST_COMPLETED)
+        await _budget_headroom(cluster)
+        running[submit_wrapped_job(puuid, name, region).future] = puuid
+    if running:
+        await reap(asyncio.ALL_COMPLETED)
+
+    elapsed = time.perf_counter() - t0
+    generated = progress["generated"]
+    calls = limiter.stats["requests"] - calls_before
+    report = {
+        "players": len(resolved),
+        "generated": generated,
+        "skipped": progress["skipped"],
+        "failed": failed,
+        "elapsed_s": round(elapsed, 1),
+        "players_per_min": round(generated / elapsed * 60, 2) if elapsed else 0.0,
+        # process-wide count: includes interactive traffic served meanwhile
+        "riot_calls": calls,
+        "riot_calls_per_player": round(calls / generated, 1) if generated else None,
     }
+    progress["report"] = report
+    log(f"🔥 Pre-warm done: {generated} built in {elapsed:.0f}s "
+        f"({report['players_per_min']} players/min, {report['riot_calls_per_player']} Riot calls/player)")
+    return report
+
+
+async def _cached_if_fresh(puuid: str, refresh: bool = False):
+    """Return (cached wrapped or None if stale/missing, stored wrapped state)."""
+    cached, state = await asyncio.gather(
+        cache_dynamo.get_cached_wrapped(puuid, "2025"),
+        asyncio.to_thread(cache.get_wrapped_state, puuid, "2025", parser.PARSER_VERSION),
+    )
+    if cached and not refresh and _is_fresh(cached.updated_at, state):
+        return cached, state
+    return None, state
+
+
+def _is_fresh(updated_at: int | None, state: dict | None) -> bool:
+    """
+    A stored wrapped is fresh while its own write is recent. Without a local state
+    (first build, or written by another container) the next build starts from scratch,
+    so it isn't served.
+    """
+    return state is not None and updated_at is not None and time.time() - updated_at < WRAPPED_REFRESH_INTERVAL
+
+
+async def _resolve_puuid(name: str, tag: str) -> str:
+    try:
+        account = await get_account_by_riot_id(name, tag)
+        return account["puuid"]
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error fetching account: {str(e)}")
 
 
 @router.get("/roast_summary/{puuid}")
-async def get_roast_summary(puuid: str, season: str = "2025"):
+async def get_roast_summary(request: Request, puuid: str, season: str = "2025"):
     """
-    Retrieve only the roast_summary field from DynamoDB cache.
+    Retrieve only the roast_summary from DynamoDB cache (its own small item,
+    the full wrapped blob is not fetched). Supports If-None-Match (304).
     """
     try:
-        data = cache_dynamo.get_roast_summary(puuid, season)
+        data = await cache_dynamo.get_roast_summary(puuid, season)
         if not data:
             raise HTTPException(status_code=404, detail="No roast summary found.")
-        return JSONResponse(data)
+        return data.response(request)
 
     except Exception as e:
         print(f"[ROAST_SUMMARY] ❌ Error retrieving: {e}")
         raise HTTPException(status_code=500, detail="Error fetching roast summary")
 
 
+@router.post("/roast_summaries")
+async def get_roast_summaries(
+    puuids: list[str] = Body(..., embed=True, description="Player PUUIDs (up to 500)."),
+    season: str = Body("2025", embed=True),
+):
+    """
+    Retrieve roast summaries for many players in one call.
+    Only the small roast items are read, in batches of 100 keys.
+    """
+    if len(puuids) > 500:
+        raise HTTPException(status_code=400, detail="At most 500 puuids per request.")
+    try:
+        found = await cache_dynamo.get_roast_summaries(puuids, season)
+    except Exception as e:
+        print(f"[ROAST_SUMMARY] ❌ Error batch retrieving: {e}")
+        raise HTTPException(status_code=500, detail="Error fetching roast summaries")
+    return JSONResponse({
+        "summaries": found,
+        "missing": [p for p in dict.fromkeys(puuids) if p not in found],
+    })
+
+
+@router.post("/prewarm", status_code=202)
+async def prewarm(
+    players: list[str] = Body(..., embed=True, description="Riot IDs (name#tag) and/or PUUIDs."),
+    region: str = Body("na1", embed=True),
+    refresh: bool = Body(False, embed=True, description="Rebuild players that already have a fresh cached result."),
+):
+    """
+    Queue a pre-warm batch and return its id; poll /wrapped/prewarm/{batch_id}.
+    The finished batch's progress carries a throughput report (players/min, Riot calls per player).
+    """
+    if len(players) > PREWARM_MAX_PLAYERS:
+        raise HTTPException(status_code=400, detail=f"At most {PREWARM_MAX_PLAYERS} players per batch.")
+    digest = hashlib.sha256("\n".join(sorted(set(players))).encode()).hexdigest()[:16]
+    key = ("prewarm", region, refresh, digest)
+    batch = batches.submit(key, prewarm_players, players, region, refresh)
+    return JSONResponse(batch.to_dict(), status_code=202)
+
+
+@router.get("/prewarm/{batch_id}")
+async def prewarm_status(batch_id: str):
+    batch = batches.get(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Unknown batch id.")
+    return JSONResponse(batch.to_dict())
+
+
+@router.get("/jobs/{job_id}")
+async def wrapped_job_status(job_id: str):
+    """
+    Poll a wrapped generation job.
+    Returns status (queued/running/done/failed) and progress (matches fetched/parsed/total).
+    """
+    job = jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Unknown job id.")
+    return JSONResponse(job.to_dict())
+
+
+@router.post("/{name}/{tag}", status_code=202)
+async def enqueue_wrapped(
+    name: str,
+    tag: str,
+    region: str = Query("na1"),
+    count: int | None = Query(None, description="Optional limit on number of matches to fetch."),
+    refresh: bool = Query(False, description="Rebuild even if a fresh cached result exists."),
+):
+    """
+    Queue wrapped generation and return immediately with a job id to poll at
+    /wrapped/jobs/{job_id}. Requests for a player already being built attach to that job.
+    Once done, GET /wrapped/{name}/{tag} serves the cached result.
+    """
+    puuid = await _resolve_puuid(name, tag)
+
+    cached, _ = await _cached_if_fresh(puuid, refresh or bool(count))
+    if cached:
+        return JSONResponse({"job_id": None, "status": "done", "cached": True, "puuid": puuid})
+
+    job = submit_wrapped_job(puuid, name, region, count)
+    return JSONResponse({**job.to_dict(), "cached": False, "puuid": puuid}, status_code=202)
+
+
 # # ✅ Normal route using PUUID
 # @router.get("/{region}/{puuid}")
 # async def get_wrapped_by_puuid(
@@ -169,6 +545,7 @@ async def get_roast_summary(puuid: str, season: str = "2025"):
 
 @router.get("/{name}/{tag}")
 async def wrapped_by_riot_id(
+    request: Request,
     name: str,
     tag: str,
     region: str = Query("na1"),
@@ -176,37 +553,51 @@ async def wrapped_by_riot_id(
         None,
         description="Optional limit on number of matches to fetch. If omitted, retrieves all matches for the year.",
     ),
+    refresh: bool = Query(
+        False,
+        description="Fold in games played since the cached result, even if it is still fresh.",
+    ),
+    detail: Literal["fast", "full"] = Query(
+        "full",
+        description="'fast' skips match timelines on a first build (dragon subtypes, elders and shutdowns are unavailable) and backfills full detail in the background.",
+    ),
 ):
     log(f"Processing wrapped request for {name}#{tag} (region={region}, count={count})")
 
-    try:
-        account = await get_account_by_riot_id(name, tag)
-        puuid = account["puuid"]
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error fetching account: {str(e)}")
+    puuid = await _resolve_puuid(name, tag)
 
-    cached = cache_dynamo.get_cached_wrapped(puuid, "2025")
+    # the stored result is the whole season, so it can't answer a count-capped request
+    cached, state = await _cached_if_fresh(puuid, refresh or bool(count))
     if cached:
-        return JSONResponse(cached)
-
-    cluster = riot_api.region_to_cluster(region)
-    log(f"Using cluster: {cluster}")
-
-    # 🧠 count now passed directly
-    summary = await generate_wrapped(cluster, puuid, summoner_name=name, count=count)
-
-    extra_stats = compute_additional_player_metrics(summary["raw_matches"])
-    summary["extra_stats"] = extra_stats
-
-    formatted = process_wrapped_output(summary)
-    roast_summary = build_player_data(summary, formatted)
-
-    formatted["roast_summary"] = roast_summary
-    # formatted["summary"] = summary
-
-    # ✅ Always cache, regardless of count
-    cache_dynamo.put_cached_wrapped(
-        puuid, formatted, "2025", region, roast_summary=roast_summary
-    )
-
+        # stored bytes, served in the client's encoding (no decode/re-encode),
+        # or a 304 if the client already has this version
+        return cached.response(request)
+
+    if detail == "fast" and state is None and not jobs.find((puuid, "2025")):
+        # ⚡ Nothing to fold into yet: answer without timelines, fill in the rest later.
+        # The fast build is a job like any other (bounded by WRAPPED_WORKERS, shared by
+        # concurrent requests); the full build is queued once it is done, so it
+        # reuses the matches just cached instead of fetching them alongside it.
+        # Count-capped builds are never stored, so those get no background build
+        fast_key = (puuid, "2025", count, "fast")
+        queued = jobs.find(fast_key) is None
+        fast = jobs.submit(fast_key, build_wrapped, puuid, name, region, count, detail="fast")
+        if queued and not count:
+            fast.future.add_done_callback(
+                lambda f: f.cancelled() or f.exception() or submit_wrapped_job(puuid, name, region)
+            )
+        formatted = await asyncio.shield(fast.future)
+        # partial result: don't let anything in between cache it
+        return JSONResponse(formatted, headers={"Cache-Control": "no-store"})
+
+    # 🧠 Run through the job queue so concurrent requests share one build
+    job = submit_wrapped_job(puuid, name, region, count)
+    formatted = await asyncio.shield(job.future)
+    if count:
+        # count-capped builds aren't stored: the cached payload is some other build
+        return JSONResponse(formatted, headers={"Cache-Control": "no-store"})
+    # the build just stored its encoded payload: serve that, with its ETag
+    cached = await cache_dynamo.get_cached_wrapped(puuid, "2025")
+    if cached:
+        return cached.response(request)
     return JSONResponse(formatted)
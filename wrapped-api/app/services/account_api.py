@@ -1,5 +1,9 @@
 import os
-import aiohttp
+
+from app.services.http_client import http
+from app.services.rate_limiter import limiter
+from app.services.riot_fetcher import cached_call
+from app.services.singleflight import flights
 
 RIOT_API_KEY = os.getenv("RIOT_API_KEY")
 BASE_URL = "https://americas.api.riotgames.com"
@@ -10,9 +14,27 @@ async def get_account_by_riot_id(name: str, tag: str):
     print(url)
     headers = {"X-Riot-Token": RIOT_API_KEY}
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, headers=headers) as resp:
+    async def get():
+        async with limiter.get(http.session, url, "account-v1.getByRiotId", headers=headers) as resp:
             if resp.status != 200:
                 print(resp.status)
                 raise RuntimeError(f"Error {resp.status} fetching Riot account for {name}#{tag}")
             return await resp.json()
+
+    # concurrent lookups of the same Riot ID share one call; Riot IDs rarely move, so keep them a day
+    key = f"account:{name.lower()}#{tag.lower()}"
+    return await cached_call(key, flights.do, url.lower(), get)
+
+
+async def get_account_by_puuid(puuid: str):
+    """Fetch Riot account info (puuid, gameName, tagLine) from a PUUID."""
+    url = f"{BASE_URL}/riot/account/v1/accounts/by-puuid/{puuid}"
+    headers = {"X-Riot-Token": RIOT_API_KEY}
+
+    async def get():
+        async with limiter.get(http.session, url, "account-v1.getByPuuid", headers=headers) as resp:
+            if resp.status != 200:
+                raise RuntimeError(f"Error {resp.status} fetching Riot account for {puuid}")
+            return await resp.json()
+
+    return await cached_call(f"account:puuid:{puuid}", flights.do, url, get)
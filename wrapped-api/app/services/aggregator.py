@@ -1,6 +1,15 @@
 from collections import defaultdict, Counter
 from datetime import datetime, timezone
 
+# Per-match numeric fields summed straight into the global totals
+SUM_FIELDS = ["kills","deaths","assists","barons","dragons","elder_dragons","riftHeralds",
+              "turrets","inhibitors","wardsPlaced","wardsKilled","controlWardsPlaced",
+              "turretPlates","soloKills","goldEarned","cs",
+              "doubleKills","tripleKills","quadraKills","pentaKills",
+              "killstreaks_ended","bounty_collected","visionScore"]
+# Only known from match timelines: None in rows built without one (detail="fast")
+TIMELINE_FIELDS = ["elder_dragons","killstreaks_ended","bounty_collected"]
+
 def _safe_div(n, d):
     return n / d if d else 0.0
 
@@ -9,46 +18,148 @@ def _month_key(ms: int) -> str:
         return "unknown"
     return datetime.fromtimestamp(ms/1000, tz=timezone.utc).strftime("%Y-%m")
 
-def aggregate_global(matches: list[dict]):
-    totals = defaultdict(float)
-    months = defaultdict(lambda: {"games":0,"kills":0,"deaths":0,"assists":0,"dpm_sum":0.0})
+# --------------------------------------------------------------------
+# Mergeable aggregate state
+#
+# A plain (JSON-serializable) dict of raw sums, counts and streak boundaries.
+# States built from consecutive slices of a match history (newest first, the
+# order match history is listed in) can be combined with merge(a, b), where `a`
+# covers the newer slice. The finalize_* functions turn a state into the
+# rounded values the wrapped output uses.
+# --------------------------------------------------------------------
+def new_state() -> dict:
+    return {
+        "totals": {},
+        "total_damage": 0,
+        "total_duration_minutes": 0,
+        "kp_sum": 0,
+        "gpm_sum": 0,
+        "cspm_sum": 0,
+        # wins at the start / end of the slice, longest run inside it
+        "streak": {"games": 0, "prefix": 0, "suffix": 0, "longest": 0},
+        "months": {},
+        "champions": {},
+        "roles": {},
+        "dragon_types": {},
+        # rows without timeline-derived stats; any makes those totals unavailable
+        "untimed": 0,
+    }
+
+def add_match(state: dict, m: dict) -> dict:
+    """Fold one parsed match (parser.extract_stats row) into `state` in place."""
+    totals = state["totals"]
+    for k in SUM_FIELDS:
+        totals[k] = totals.get(k, 0.0) + (m.get(k) or 0)
+    if m.get("detail") == "fast":
+        state["untimed"] += 1
+
+    totals["wins"] = totals.get("wins", 0.0) + (1 if m["win"] else 0)
+    totals["matches"] = totals.get("matches", 0.0) + 1
+    totals["duration_s"] = totals.get("duration_s", 0.0) + m.get("duration_s", 0)
+    totals["firstBloods"] = totals.get("firstBloods", 0.0) + (1 if m.get("firstBlood") else 0)
+
+    state["total_damage"] += m.get("totalDamageDealtToChampions", 0)
+    state["total_duration_minutes"] += m.get("duration_s", 0) / 60
+
+    s = state["streak"]
+    if m.get("win"):
+        if s["prefix"] == s["games"]:
+            s["prefix"] += 1
+        s["suffix"] += 1
+        s["longest"] = max(s["longest"], s["suffix"])
+    else:
+        s["suffix"] = 0
+    s["games"] += 1
+
+    mo = state["months"].setdefault(
+        _month_key(m.get("end_ts")), {"games":0,"kills":0,"deaths":0,"assists":0,"dpm_sum":0.0}
+    )
+    mo["games"] += 1
+    mo["kills"] += m["kills"]
+    mo["deaths"] += m["deaths"]
+    mo["assists"] += m["assists"]
+    mo["dpm_sum"] += (m.get("damagePerMinute") or 0.0)
+
+    state["kp_sum"] += m["killParticipation"]
+    state["gpm_sum"] += m.get("goldPerMinute") or 0.0
+    state["cspm_sum"] += m.get("csPerMinute") or 0.0
+
+    ce = state["champions"].setdefault(m["champion"], {"games":0,"wins":0,"kills":0,"deaths":0,"assists":0})
+    ce["games"] += 1
+    ce["wins"]  += 1 if m["win"] else 0
+    ce["kills"] += m["kills"]
+    ce["deaths"]+= m["deaths"]
+    ce["assists"]+= m["assists"]
 
-    total_damage = 0
-    total_duration_minutes = 0
-    longest_streak = 0
-    current_streak = 0
+    re = state["roles"].setdefault(m["role"], {"games":0,"wins":0})
+    re["games"] += 1
+    re["wins"]  += 1 if m["win"] else 0
 
+    dragons = state["dragon_types"]
+    for subtype, n in (m.get("dragon_types") or {}).items():
+        dragons[subtype] = dragons.get(subtype, 0) + n
+
+    return state
+
+def build_state(matches: list[dict]) -> dict:
+    state = new_state()
     for m in matches:
-        for k in ["kills","deaths","assists","barons","dragons","elder_dragons","riftHeralds",
-                  "turrets","inhibitors","wardsPlaced","wardsKilled","controlWardsPlaced",
-                  "turretPlates","soloKills","goldEarned","cs",
-                  "doubleKills","tripleKills","quadraKills","pentaKills",
-                  "killstreaks_ended","bounty_collected","visionScore"]:
-            totals[k] += m.get(k, 0)
-
-        totals["wins"] += 1 if m["win"] else 0
-        totals["matches"] += 1
-        totals["duration_s"] += m.get("duration_s", 0)
-        totals["firstBloods"] += 1 if m.get("firstBlood") else 0
-
-        # --- Damage tracking ---
-        dmg = m.get("totalDamageDealtToChampions", 0)
-        total_damage += dmg
-        dur_min = m.get("duration_s", 0) / 60
-        total_duration_minutes += dur_min
-
-        if m.get("win"):
-            current_streak += 1
-            longest_streak = max(longest_streak, current_streak)
-        else:
-            current_streak = 0
-
-        mo = _month_key(m.get("end_ts"))
-        months[mo]["games"] += 1
-        months[mo]["kills"] += m["kills"]
-        months[mo]["deaths"] += m["deaths"]
-        months[mo]["assists"] += m["assists"]
-        months[mo]["dpm_sum"] += (m.get("damagePerMinute") or 0.0)
+        add_match(state, m)
+    return state
+
+def _merge_sums(a: dict, b: dict) -> dict:
+    out = dict(a)
+    for k, v in b.items():
+        out[k] = out[k] + v if k in out else v
+    return out
+
+def _merge_nested(a: dict, b: dict) -> dict:
+    out = {k: dict(v) for k, v in a.items()}
+    for k, v in b.items():
+        out[k] = _merge_sums(out[k], v) if k in out else dict(v)
+    return out
+
+def merge(a: dict, b: dict) -> dict:
+    """
+    Combine two states into a new one. `a` must cover the games that come
+    before `b` in match-history order (only the win streak depends on it).
+    """
+    sa, sb = a["streak"], b["streak"]
+    streak = {
+        "games": sa["games"] + sb["games"],
+        "prefix": sa["prefix"] + sb["prefix"] if sa["prefix"] == sa["games"] else sa["prefix"],
+        "suffix": sb["suffix"] + sa["suffix"] if sb["suffix"] == sb["games"] else sb["suffix"],
+        "longest": max(sa["longest"], sb["longest"], sa["suffix"] + sb["prefix"]),
+    }
+    return {
+        "totals": _merge_sums(a["totals"], b["totals"]),
+        "total_damage": a["total_damage"] + b["total_damage"],
+        "total_duration_minutes": a["total_duration_minutes"] + b["total_duration_minutes"],
+        "kp_sum": a["kp_sum"] + b["kp_sum"],
+        "gpm_sum": a["gpm_sum"] + b["gpm_sum"],
+        "cspm_sum": a["cspm_sum"] + b["cspm_sum"],
+        "streak": streak,
+        "months": _merge_nested(a["months"], b["months"]),
+        "champions": _merge_nested(a["champions"], b["champions"]),
+        "roles": _merge_nested(a["roles"], b["roles"]),
+        "dragon_types": _merge_sums(a["dragon_types"], b["dragon_types"]),
+        "untimed": a["untimed"] + b["untimed"],
+    }
+
+def _champion_rows(state: dict):
+    for c, s in state["champions"].items():
+        wr = round(_safe_div(s["wins"], s["games"]) * 100, 1)
+        kda = round(_safe_div(s["kills"]+s["assists"], s["deaths"] if s["deaths"] else 1), 2)
+        yield c, s, wr, kda
+
+# --------------------------------------------------------------------
+# Finalize steps
+# --------------------------------------------------------------------
+def finalize_global(state: dict):
+    totals = defaultdict(float, state["totals"])
+    total_damage = state["total_damage"]
+    total_duration_minutes = state["total_duration_minutes"]
+    matches = state["streak"]["games"]
 
     totals["losses"] = totals["matches"] - totals["wins"]
     totals["win_rate"] = round(_safe_div(totals["wins"], totals["matches"]) * 100, 1)
@@ -57,7 +168,12 @@ def aggregate_global(matches: list[dict]):
     totals["DamageDealt"] = total_damage
     totals["DamagePerMinute"] = round(_safe_div(total_damage, total_duration_minutes), 2) if total_duration_minutes else 0.0
 
-    totals["LongestWinStreak"] = int(longest_streak)
+    totals["LongestWinStreak"] = int(state["streak"]["longest"])
+
+    if state["untimed"]:
+        # a partial sum would pass for the real total
+        for k in TIMELINE_FIELDS:
+            totals[k] = None
 
     seconds = int(totals["duration_s"])
     totals["time_played"] = {
@@ -68,7 +184,7 @@ def aggregate_global(matches: list[dict]):
     }
 
     monthly_trends = []
-    for mo, v in sorted(months.items()):
+    for mo, v in sorted(state["months"].items()):
         d = v["deaths"] or 1
         monthly_trends.append({
             "month": mo,
@@ -77,40 +193,20 @@ def aggregate_global(matches: list[dict]):
             "dpm": round(_safe_div(v["dpm_sum"], v["games"]), 2) if v["games"] else 0.0
         })
 
-    totals["kill_participation_avg"] = round(_safe_div(sum(m["killParticipation"] for m in matches), len(matches)) * 100, 1)
-    totals["gold_per_min_avg"] = round(_safe_div(sum(m.get("goldPerMinute") or 0.0 for m in matches), len(matches)), 2)
-    totals["cs_per_min_avg"] = round(_safe_div(sum(m.get("csPerMinute") or 0.0 for m in matches), len(matches)), 2)
+    totals["kill_participation_avg"] = round(_safe_div(state["kp_sum"], matches) * 100, 1)
+    totals["gold_per_min_avg"] = round(_safe_div(state["gpm_sum"], matches), 2)
+    totals["cs_per_min_avg"] = round(_safe_div(state["cspm_sum"], matches), 2)
 
-    monthly_activity = [{"month": mo, "games": v["games"]} for mo, v in sorted(months.items())]
+    monthly_activity = [{"month": mo, "games": v["games"]} for mo, v in sorted(state["months"].items())]
 
     return dict(totals), monthly_trends, monthly_activity
 
-
-def champion_role_analytics(matches: list[dict], champ_tags_map: dict):
-    champ = defaultdict(lambda: {"games":0,"wins":0,"kills":0,"deaths":0,"assists":0})
-    roles = defaultdict(lambda: {"games":0,"wins":0})
-    dragon_types_total = Counter()
-
-    for m in matches:
-        c, r = m["champion"], m["role"]
-
-        ce = champ[c]
-        ce["games"] += 1
-        ce["wins"]  += 1 if m["win"] else 0
-        ce["kills"] += m["kills"]
-        ce["deaths"]+= m["deaths"]
-        ce["assists"]+= m["assists"]
-
-        re = roles[r]
-        re["games"] += 1
-        re["wins"]  += 1 if m["win"] else 0
-
-        dragon_types_total.update(m.get("dragon_types", {}))
+def finalize_champion_roles(state: dict, champ_tags_map: dict):
+    champ = state["champions"]
+    roles = defaultdict(lambda: {"games":0,"wins":0}, state["roles"])
 
     champ_summary = []
-    for c, s in champ.items():
-        wr = round(_safe_div(s["wins"], s["games"]) * 100, 1)
-        kda = round(_safe_div(s["kills"]+s["assists"], s["deaths"] if s["deaths"] else 1), 2)
+    for c, s, wr, kda in _champion_rows(state):
         tags = champ_tags_map.get(c, {}).get("tags", ["Unknown"])
         champ_summary.append({
             "champion": c,
@@ -141,20 +237,10 @@ def champion_role_analytics(matches: list[dict], champ_tags_map: dict):
         "top_role": top_role,
         "secondary_role": secondary_role,
         "role_summary": ordered_roles,
-        "dragon_breakdown": dict(dragon_types_total)
+        "dragon_breakdown": None if state["untimed"] else dict(Counter(state["dragon_types"]))
     }
 
-def best_champions_with_mastery(matches: list[dict], mastery_list: list | None, key_to_name_map: dict):
-    agg = defaultdict(lambda: {"games":0,"wins":0,"kills":0,"deaths":0,"assists":0})
-    for m in matches:
-        c = m["champion"]
-        a = agg[c]
-        a["games"] += 1
-        a["wins"]  += 1 if m["win"] else 0
-        a["kills"] += m["kills"]
-        a["deaths"]+= m["deaths"]
-        a["assists"]+= m["assists"]
-
+def finalize_best_champions(state: dict, mastery_list: list | None, key_to_name_map: dict):
     champ_points = defaultdict(int)
     for item in mastery_list or []:
         key = str(item.get("championId"))
@@ -163,9 +249,7 @@ def best_champions_with_mastery(matches: list[dict], mastery_list: list | None,
             champ_points[name] = item.get("championPoints", 0)
 
     rows = []
-    for name, s in agg.items():
-        wr = round(_safe_div(s["wins"], s["games"])*100, 1)
-        kda = round(_safe_div(s["kills"]+s["assists"], s["deaths"] if s["deaths"] else 1), 2)
+    for name, s, wr, kda in _champion_rows(state):
         rows.append({
             "champion": name,
             "games": s["games"],
@@ -176,3 +260,16 @@ def best_champions_with_mastery(matches: list[dict], mastery_list: list | None,
     rows.sort(key=lambda x: (x["games"], x["win_rate"], x["mastery_points"]), reverse=True)
     best_by_wr = sorted([r for r in rows if r["games"] >= 10], key=lambda x: x["win_rate"], reverse=True)[:5]
     return {"by_activity": rows[:10], "best_by_winrate_min10": best_by_wr}
+
+# --------------------------------------------------------------------
+# Match-list entry points (build + finalize in one go)
+# --------------------------------------------------------------------
+def aggregate_global(matches: list[dict]):
+    return finalize_global(build_state(matches))
+
+
+def champion_role_analytics(matches: list[dict], champ_tags_map: dict):
+    return finalize_champion_roles(build_state(matches), champ_tags_map)
+
+def best_champions_with_mastery(matches: list[dict], mastery_list: list | None, key_to_name_map: dict):
+    return finalize_best_champions(build_state(matches), mastery_list, key_to_name_map)
@@ -1,4 +1,4 @@
-import sqlite3, json, os
+import sqlite3, json, os, time
 from contextlib import contextmanager
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "cache.db")
@@ -8,10 +8,52 @@ def init_cache():
     """Create the cache table if it doesn’t exist."""
     with sqlite3.connect(DB_PATH) as conn:
         conn.execute("""
-        CREATE TABLE IF NOT EXISTS matches (
-            match_id TEXT PRIMARY KEY,
+        CREATE TABLE IF NOT EXISTS parsed_matches (
+            match_id TEXT NOT NULL,
+            puuid TEXT NOT NULL,
+            version INTEGER NOT NULL,
             data TEXT NOT NULL,
-            ts DATETIME DEFAULT CURRENT_TIMESTAMP
+            ts DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (match_id, puuid)
+        )
+        """)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS wrapped_state (
+            puuid TEXT NOT NULL,
+            season TEXT NOT NULL,
+            last_end_ts INTEGER NOT NULL,
+            match_ids TEXT NOT NULL,
+            rows TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (puuid, season)
+        )
+        """)
+        # states stored before rows were versioned read as version 0 and get rebuilt
+        cols = {r[1] for r in conn.execute("PRAGMA table_info(wrapped_state)")}
+        if "version" not in cols:
+            conn.execute("ALTER TABLE wrapped_state ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        # Per-player match-ID index: every ID Riot listed for a puuid, with the
+        # listing window it came from (end_ts once the match has been parsed)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS match_index (
+            puuid TEXT NOT NULL,
+            match_id TEXT NOT NULL,
+            game_id INTEGER NOT NULL,
+            listed_lo INTEGER NOT NULL,
+            listed_hi INTEGER NOT NULL,
+            end_ts INTEGER,
+            PRIMARY KEY (puuid, match_id)
+        )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_match_index_game ON match_index (puuid, game_id)")
+        # [synced_from, synced_to] is the window whose IDs are all in match_index
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS match_index_sync (
+            puuid TEXT PRIMARY KEY,
+            synced_from INTEGER NOT NULL,
+            synced_to INTEGER NOT NULL,
+            synced_at REAL NOT NULL
         )
         """)
         conn.commit()
@@ -26,19 +68,162 @@ def get_conn():
         conn.close()
 
 
-def get_match(match_id: str):
-    """Return parsed match JSON if cached, else None."""
+def get_parsed_match(match_id: str, puuid: str, version: int):
+    """Return the parser.extract_stats row for (match_id, puuid) if cached at `version`, else None."""
     with get_conn() as conn:
-        cur = conn.execute("SELECT data FROM matches WHERE match_id=?", (match_id,))
+        cur = conn.execute(
+            "SELECT data FROM parsed_matches WHERE match_id=? AND puuid=? AND version=?",
+            (match_id, puuid, version),
+        )
         row = cur.fetchone()
         return json.loads(row[0]) if row else None
 
 
-def set_match(match_id: str, data: dict):
-    """Store parsed match JSON."""
+def get_parsed_matches(match_ids: list[str], puuid: str, version: int) -> dict:
+    """Bulk variant of get_parsed_match: {match_id: row} for every cached hit."""
+    out = {}
+    with get_conn() as conn:
+        for i in range(0, len(match_ids), 500):
+            chunk = match_ids[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            cur = conn.execute(
+                f"SELECT match_id, data FROM parsed_matches WHERE puuid=? AND version=? AND match_id IN ({marks})",
+                (puuid, version, *chunk),
+            )
+            for match_id, data in cur:
+                out[match_id] = json.loads(data)
+    return out
+
+
+def count_parsed_matches(puuids: list[str], version: int) -> dict:
+    """{puuid: number of parsed match rows stored for them}; players with none are left out."""
+    out = {}
+    with get_conn() as conn:
+        for i in range(0, len(puuids), 500):
+            chunk = puuids[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            cur = conn.execute(
+                f"SELECT puuid, COUNT(*) FROM parsed_matches WHERE version=? AND puuid IN ({marks}) GROUP BY puuid",
+                (version, *chunk),
+            )
+            out.update(cur.fetchall())
+    return out
+
+
+def set_parsed_match(match_id: str, puuid: str, version: int, data: dict):
+    """Store a parsed row; rows written by an older parser version are replaced."""
+    with get_conn() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO parsed_matches (match_id, puuid, version, data) VALUES (?, ?, ?, ?)",
+            (match_id, puuid, version, json.dumps(data)),
+        )
+        conn.commit()
+
+
+def set_parsed_matches(match_id: str, rows: dict, version: int):
+    """Store the parsed rows of every participant in a match ({puuid: row}) in one transaction."""
+    with get_conn() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO parsed_matches (match_id, puuid, version, data) VALUES (?, ?, ?, ?)",
+            [(match_id, puuid, version, json.dumps(data)) for puuid, data in rows.items()],
+        )
+        conn.commit()
+
+
+def get_wrapped_state(puuid: str, season: str, version: int):
+    """
+    Return the per-match parsed rows behind a cached wrapped result if stored at
+    parser `version`, else None. Shape: {last_end_ts, match_ids, rows, updated_at}
+    with match_ids/rows newest first.
+    """
+    with get_conn() as conn:
+        cur = conn.execute(
+            "SELECT last_end_ts, match_ids, rows, updated_at FROM wrapped_state "
+            "WHERE puuid=? AND season=? AND version=?",
+            (puuid, season, version),
+        )
+        row = cur.fetchone()
+        if not row:
+            return None
+        return {
+            "last_end_ts": row[0],
+            "match_ids": json.loads(row[1]),
+            "rows": json.loads(row[2]),
+            "updated_at": row[3],
+        }
+
+
+def set_wrapped_state(puuid: str, season: str, version: int, match_ids: list[str], rows: list[dict]):
+    """Store parsed rows + the newest game end we've seen so the next refresh can be incremental."""
+    last_end_ts = max((r.get("end_ts") or 0 for r in rows), default=0)
+    updated_at = time.time()
+    with get_conn() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO wrapped_state (puuid, season, last_end_ts, match_ids, rows, updated_at, version) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (puuid, season, last_end_ts, json.dumps(match_ids), json.dumps(rows), updated_at, version),
+        )
+        conn.commit()
+
+
+def game_id(match_id: str) -> int:
+    # NA1_5012345678 -> 5012345678; increases with game creation within a platform
+    try:
+        return int(match_id.rsplit("_", 1)[-1])
+    except ValueError:
+        return 0
+
+
+def get_match_index_sync(puuid: str):
+    """Return {synced_from, synced_to, synced_at} (unix seconds) for a player's match index, or None."""
+    with get_conn() as conn:
+        row = conn.execute(
+            "SELECT synced_from, synced_to, synced_at FROM match_index_sync WHERE puuid=?", (puuid,)
+        ).fetchone()
+    if not row:
+        return None
+    return {"synced_from": row[0], "synced_to": row[1], "synced_at": row[2]}
+
+
+def set_match_index_sync(puuid: str, synced_from: int, synced_to: int):
     with get_conn() as conn:
         conn.execute(
-            "INSERT OR REPLACE INTO matches (match_id, data) VALUES (?, ?)",
-            (match_id, json.dumps(data)),
+            "INSERT OR REPLACE INTO match_index_sync (puuid, synced_from, synced_to, synced_at) VALUES (?, ?, ?, ?)",
+            (puuid, synced_from, synced_to, time.time()),
         )
         conn.commit()
+
+
+def add_match_index(puuid: str, entries: list[tuple[str, int, int]]):
+    """Record listed (match_id, listed_lo, listed_hi) entries; already-indexed IDs keep what they have."""
+    with get_conn() as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO match_index (puuid, match_id, game_id, listed_lo, listed_hi) VALUES (?, ?, ?, ?, ?)",
+            [(puuid, mid, game_id(mid), lo, hi) for mid, lo, hi in entries],
+        )
+        conn.commit()
+
+
+def set_match_index_times(puuid: str, end_times: dict):
+    """Pin exact end times ({match_id: unix seconds}) once matches have been parsed."""
+    with get_conn() as conn:
+        conn.executemany(
+            "UPDATE match_index SET end_ts=? WHERE puuid=? AND match_id=?",
+            [(ts, puuid, mid) for mid, ts in end_times.items()],
+        )
+        conn.commit()
+
+
+def get_indexed_match_ids(puuid: str, start_ts: int, end_ts: int, limit: int | None = None) -> list[str]:
+    """
+    Indexed IDs in [start_ts, end_ts], newest first. IDs without an exact end time
+    are included when their listing window overlaps the range.
+    """
+    with get_conn() as conn:
+        cur = conn.execute(
+            "SELECT match_id FROM match_index WHERE puuid=? "
+            "AND COALESCE(end_ts, listed_hi) >= ? AND COALESCE(end_ts, listed_lo) <= ? "
+            "ORDER BY game_id DESC LIMIT ?",
+            (puuid, start_ts, end_ts, limit if limit else -1),
+        )
+        return [r[0] for r in cur]
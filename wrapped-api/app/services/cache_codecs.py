@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+import time
+import zlib
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to stdlib json
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # optional: falls back to zlib
+    zstandard = None
+
+# --------------------------------------------------------------------
+# Cache blob codecs
+#
+# Every cache row records the codec that wrote it, so rows written by an
+# older/other codec (or plain json.dumps text from before codecs existed)
+# keep decoding after the configuration changes.
+# --------------------------------------------------------------------
+ZSTD_LEVEL = int(os.getenv("CACHE_ZSTD_LEVEL", 3))
+ZLIB_LEVEL = int(os.getenv("CACHE_ZLIB_LEVEL", 6))
+
+
+def _dumps(obj) -> bytes:
+    return orjson.dumps(obj) if orjson else json.dumps(obj, separators=(",", ":")).encode()
+
+
+def _loads(blob):
+    return orjson.loads(blob) if orjson else json.loads(blob)
+
+
+# zstandard (de)compressor objects must not be shared between threads, and the
+# cache writer, to_thread reads and the admin benchmark all run on different ones
+_zstd = threading.local()
+
+
+def _zc():
+    if not hasattr(_zstd, "c"):
+        _zstd.c = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+    return _zstd.c
+
+
+def _zd():
+    if not hasattr(_zstd, "d"):
+        _zstd.d = zstandard.ZstdDecompressor()
+    return _zstd.d
+
+
+class Codec:
+    def __init__(self, name: str, encode, decode):
+        self.name = name
+        self.encode = encode
+        self.decode = decode
+
+
+CODECS: dict[str, Codec] = {
+    # legacy rows: TEXT from json.dumps
+    "json": Codec("json", json.dumps, json.loads),
+    "json+zlib": Codec(
+        "json+zlib",
+        lambda obj: zlib.compress(_dumps(obj), ZLIB_LEVEL),
+        lambda blob: _loads(zlib.decompress(blob)),
+    ),
+    # compact JSON bytes; uses orjson when installed, readable either way
+    "orjson": Codec("orjson", _dumps, _loads),
+}
+if zstandard:
+    CODECS["zstd"] = Codec(
+        "zstd",
+        lambda obj: _zc().compress(_dumps(obj)),
+        lambda blob: _loads(_zd().decompress(blob)),
+    )
+
+# best available compressed codec for bulky, immutable payloads
+DEFAULT_BLOB_CODEC = "zstd" if zstandard else "json+zlib"
+
+
+def _parse_prefix_map(spec: str) -> dict[str, str]:
+    """'match:=zstd,timeline:=zstd' -> {'match:': 'zstd', 'timeline:': 'zstd'}"""
+    out = {}
+    for part in spec.split(","):
+        if "=" in part:
+            prefix, name = part.strip().split("=", 1)
+            if name in CODECS:
+                out[prefix] = name
+            else:
+                print(f"[CACHE] ⚠️ Unknown codec '{name}' for '{prefix}', using json")
+    return out
+
+
+# Codec used for new rows, selected by key prefix
+PREFIX_CODECS = _parse_prefix_map(
+    os.getenv(
+        "CACHE_CODECS",
+        f"match:={DEFAULT_BLOB_CODEC},timeline:={DEFAULT_BLOB_CODEC},raw:={DEFAULT_BLOB_CODEC}",
+    )
+)
+
+
+def for_key(key: str) -> Codec:
+    for prefix, name in PREFIX_CODECS.items():
+        if key.startswith(prefix):
+            return CODECS[name]
+    return CODECS["json"]
+
+
+def decode(name: str | None, blob):
+    """Decode a stored blob with the codec recorded in its row (NULL = legacy json)."""
+    codec = CODECS.get(name or "json")
+    if codec is None:
+        raise ValueError(f"codec '{name}' is not available in this build")
+    return codec.decode(blob)
+
+
+def benchmark(samples: list, repeat: int = 3) -> dict:
+    """
+    Encode/decode `samples` (decoded cache payloads) with every available codec.
+    Returns {codec: {"bytes", "ratio_vs_json", "decode_ms"}}.
+    """
+    report = {}
+    baseline = None
+    for name, codec in CODECS.items():
+        blobs = [codec.encode(s) for s in samples]
+        size = sum(len(b) for b in blobs)
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            for b in blobs:
+                codec.decode(b)
+        decode_ms = (time.perf_counter() - t0) * 1000 / repeat
+        if name == "json":
+            baseline = size
+        report[name] = {"bytes": size, "decode_ms": round(decode_ms, 2)}
+    for row in report.values():
+        row["ratio_vs_json"] = round(row["bytes"] / baseline, 3) if baseline else None
+    return report
@@ -1,49 +1,393 @@
-import os, json, time
+import os, time
+import asyncio
+import queue
+import threading
 import boto3
 from botocore.exceptions import ClientError
 
+from app.services.hot_cache import hot, roast_key, wrapped_key
+from app.services.wrapped_payload import EncodedPayload
+
 TABLE_NAME = os.getenv("DDB_TABLE", "lolwrapped_cache")
 REGION = os.getenv("AWS_REGION", "us-east-1")
+# "aws" (default) or "memory" for the in-process stand-in (local runs / tests)
+DDB_BACKEND = os.getenv("DDB_BACKEND", "aws")
+# Point at DynamoDB Local (e.g. http://localhost:8000) instead of AWS
+DDB_ENDPOINT_URL = os.getenv("DDB_ENDPOINT_URL") or None
+
+# Write-behind: puts are batched through batch_writer off the request path
+DDB_WRITE_BATCH = int(os.getenv("DDB_WRITE_BATCH", 25))
+DDB_FLUSH_INTERVAL = float(os.getenv("DDB_FLUSH_INTERVAL", 0.5))
+# Failed writes are requeued with exponential backoff up to this many times
+DDB_MAX_RETRIES = int(os.getenv("DDB_MAX_RETRIES", 5))
+
+
+def _make_resource():
+    if DDB_BACKEND == "memory":
+        from app.services.dynamo_local import MemoryResource
+        print("[CACHE:DDB] 🧪 Using in-memory DynamoDB stand-in")
+        return MemoryResource()
+    return boto3.resource("dynamodb", region_name=REGION, endpoint_url=DDB_ENDPOINT_URL)
+
+
+def _ensure_table(resource):
+    """DynamoDB Local starts empty; create the cache table there on first use."""
+    if not DDB_ENDPOINT_URL:
+        return
+    try:
+        resource.create_table(
+            TableName=TABLE_NAME,
+            KeySchema=[
+                {"AttributeName": "puuid", "KeyType": "HASH"},
+                {"AttributeName": "season", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "puuid", "AttributeType": "S"},
+                {"AttributeName": "season", "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        print(f"[CACHE:DDB] 🆕 Created table {TABLE_NAME} at {DDB_ENDPOINT_URL}")
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ResourceInUseException":
+            raise
 
-dynamodb = boto3.resource("dynamodb", region_name=REGION)
+
+dynamodb = _make_resource()
+_ensure_table(dynamodb)
 table = dynamodb.Table(TABLE_NAME)
 
-def get_cached_wrapped(puuid: str, season: str = "2025"):
-    """Fetch wrapped data if cached."""
+
+# --------------------------------------------------------------------
+# Write-behind queue
+#
+# put_cached_wrapped() only builds the item and hands it to a background
+# thread, which drains the queue into table.batch_writer() in batches.
+# Items waiting to be written are served from _pending, so reads see them.
+# An item flagged DELETED is a queued delete: reads treat its key as missing.
+# --------------------------------------------------------------------
+DELETED = "__deleted"
+_pending: dict[tuple, dict] = {}
+_pending_lock = threading.Lock()
+_queue: queue.Queue = queue.Queue()
+_attempts: dict[tuple, int] = {}
+stats = {"queued": 0, "written": 0, "batches": 0, "failed": 0, "retried": 0}
+
+
+def _key(item: dict) -> tuple:
+    return item["puuid"], item["season"]
+
+
+def _write(writer, item: dict):
+    """put_item, or delete_item for a DELETED marker, on a table or batch writer."""
+    if item.get(DELETED):
+        writer.delete_item(Key={"puuid": item["puuid"], "season": item["season"]})
+    else:
+        writer.put_item(Item=item)
+
+
+def _put_each(items: list[dict]) -> list[dict]:
+    """
+    One put_item per item, so an invalid item (e.g. over the 400 KB limit) fails
+    alone instead of taking its whole batch with it. Returns items worth retrying.
+    """
+    retry = []
+    for item in items:
+        try:
+            _write(table, item)
+            stats["written"] += 1
+            _attempts.pop(_key(item), None)
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ValidationException":
+                stats["failed"] += 1
+                _attempts.pop(_key(item), None)
+                print(f"[CACHE:DDB] ❌ Dropping invalid item {_key(item)}: {e}")
+            else:
+                retry.append(item)
+        except Exception:
+            retry.append(item)
+    return retry
+
+
+def _writer_loop():
+    while True:
+        batch = [_queue.get()]
+        deadline = time.monotonic() + DDB_FLUSH_INTERVAL
+        while len(batch) < DDB_WRITE_BATCH:
+            try:
+                batch.append(_queue.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        requeue = []
+        try:
+            # batch_writer rejects duplicate keys in one request; keep the newest
+            latest = list({_key(i): i for i in batch}.values())
+            retry = []
+            try:
+                with table.batch_writer(overwrite_by_pkeys=["puuid", "season"]) as writer:
+                    for item in latest:
+                        _write(writer, item)
+                stats["written"] += len(latest)
+                stats["batches"] += 1
+                for item in latest:
+                    _attempts.pop(_key(item), None)
+                print(f"[CACHE:DDB] 💾 Flushed {len(latest)} wrapped items")
+            except ClientError as e:
+                if e.response["Error"]["Code"] == "ValidationException":
+                    print(f"[CACHE:DDB] ⚠️ Batch rejected ({e}), writing items one by one")
+                    retry = _put_each(latest)
+                else:
+                    print(f"[CACHE:DDB] ⚠️ Error saving cache batch: {e}")
+                    retry = latest
+            except Exception as e:
+                print(f"[CACHE:DDB] ⚠️ Error saving cache batch: {e}")
+                retry = latest
+
+            if retry:
+                with _pending_lock:
+                    # a newer put for the same key supersedes the failed one
+                    retry = [i for i in retry if _pending.get(_key(i)) is i]
+                attempt = 0
+                for item in retry:
+                    n = _attempts[_key(item)] = _attempts.get(_key(item), 0) + 1
+                    if n > DDB_MAX_RETRIES:
+                        stats["failed"] += 1
+                        _attempts.pop(_key(item), None)
+                        print(f"[CACHE:DDB] ❌ Giving up on {_key(item)} after {DDB_MAX_RETRIES} retries")
+                    else:
+                        requeue.append(item)
+                        attempt = max(attempt, n)
+                if requeue:
+                    stats["retried"] += len(requeue)
+                    time.sleep(min(30.0, 0.5 * 2 ** (attempt - 1)))
+        finally:
+            for item in requeue:
+                _queue.put(item)  # before task_done(), so flush() keeps waiting for it
+            requeued = {id(i) for i in requeue}
+            with _pending_lock:
+                for item in batch:
+                    key = _key(item)
+                    if _pending.get(key) is item and id(item) not in requeued:
+                        del _pending[key]
+            for _ in batch:
+                _queue.task_done()
+
+
+threading.Thread(target=_writer_loop, name="ddb-writer", daemon=True).start()
+
+
+def flush():
+    """Block until every queued put has been written (call on shutdown)."""
+    _queue.join()
+
+
+# Roast summaries also live in their own small item under sort key "<season>#roast",
+# so roast reads don't consume read capacity for the full `data` blob. Items
+# written before the split only have roast_summary on the main item: a miss
+# reads that once and writes the roast item, so later reads are the small one.
+ROAST_SUFFIX = "#roast"
+BATCH_GET_LIMIT = 100  # DynamoDB's per-request key limit
+
+
+def roast_season(season: str) -> str:
+    return season + ROAST_SUFFIX
+
+
+def _get_item(puuid: str, season: str):
+    with _pending_lock:
+        item = _pending.get((puuid, season))
+    if item is not None:
+        return None if item.get(DELETED) else item
+    return table.get_item(Key={"puuid": puuid, "season": season}).get("Item")
+
+
+def _payload_from_item(item: dict) -> EncodedPayload:
+    """`data` is gzip bytes (data_encoding="gzip") or, for older items, a JSON string."""
+    data, updated_at = item["data"], item.get("updated_at")
+    updated_at = int(updated_at) if updated_at is not None else None
+    if item.get("data_encoding") == "gzip":
+        return EncodedPayload(gz=bytes(getattr(data, "value", data)), etag=item.get("etag"), updated_at=updated_at)
+    return EncodedPayload(raw=data.encode("utf-8"), etag=item.get("etag"), updated_at=updated_at)
+
+
+def get_wrapped_updated_at(puuid: str, season: str = "2025") -> int | None:
+    """When the stored wrapped was written, read past the hot tier (and without filling it)."""
+    item = _get_item(puuid, season)
+    return int(item["updated_at"]) if item and item.get("updated_at") is not None else None
+
+
+def _roast_from_item(item: dict) -> EncodedPayload:
+    return EncodedPayload(raw=item["roast_summary"].encode("utf-8"), etag=item.get("etag"))
+
+
+def _roast_item(puuid: str, season: str, roast: EncodedPayload, updated_at: int) -> dict:
+    return {
+        "puuid": puuid,
+        "season": roast_season(season),
+        "roast_summary": roast.raw.decode("utf-8"),
+        "etag": roast.etag,
+        "updated_at": updated_at,
+    }
+
+
+def _enqueue(items: list[dict]):
+    with _pending_lock:
+        for i in items:
+            _pending[_key(i)] = i
+    for i in items:
+        _queue.put(i)
+    stats["queued"] += len(items)
+
+
+def _migrate_roast(puuid: str, season: str, main: dict | None) -> dict | None:
+    """Copy a pre-split main item's roast_summary into its own roast item (queued); returns that item."""
+    if not main or "roast_summary" not in main:
+        return None
+    roast = EncodedPayload(raw=main["roast_summary"].encode("utf-8"))
+    item = _roast_item(puuid, season, roast, int(main.get("updated_at") or time.time()))
+    _enqueue([item])
+    print(f"[CACHE:DDB] 🔀 Split legacy roast summary for {puuid} into its own item")
+    return item
+
+
+def _get_roast_item(puuid: str, season: str):
+    item = _get_item(puuid, roast_season(season))
+    if item is None:
+        item = _migrate_roast(puuid, season, _get_item(puuid, season))
+    return item
+
+
+def _batch_get_roasts(puuids: list[str], season: str) -> dict:
+    found = _batch_get(puuids, roast_season(season))
+    legacy = [p for p in puuids if p not in found]
+    if legacy:
+        for puuid, main in _batch_get(legacy, season).items():
+            item = _migrate_roast(puuid, season, main)
+            if item:
+                found[puuid] = item
+    return found
+
+
+def _batch_get(puuids: list[str], season: str) -> dict:
+    """batch_get_item over (puuid, season) keys, retrying unprocessed keys. Returns {puuid: item}."""
+    found, pending = {}, set()
+    with _pending_lock:
+        for p in puuids:
+            if (p, season) in _pending:
+                pending.add(p)
+                if not _pending[(p, season)].get(DELETED):
+                    found[p] = _pending[(p, season)]
+    todo = [{"puuid": p, "season": season} for p in dict.fromkeys(puuids) if p not in pending]
+
+    for i in range(0, len(todo), BATCH_GET_LIMIT):
+        request = {TABLE_NAME: {"Keys": todo[i:i + BATCH_GET_LIMIT]}}
+        for attempt in range(5):
+            res = dynamodb.batch_get_item(RequestItems=request)
+            for item in res.get("Responses", {}).get(TABLE_NAME, []):
+                found[item["puuid"]] = item
+            request = res.get("UnprocessedKeys") or {}
+            if not request:
+                break
+            time.sleep(0.05 * 2 ** attempt)
+        else:
+            print(f"[CACHE:DDB] ⚠️ Gave up on {len(request[TABLE_NAME]['Keys'])} unprocessed keys")
+    return found
+
+
+async def get_cached_wrapped(puuid: str, season: str = "2025") -> EncodedPayload | None:
+    """
+    Fetch wrapped data if cached (in-process hot tier first), as an EncodedPayload:
+    call .response(request) to serve it as stored, or .obj() for the dict.
+    """
+    data = hot.get(wrapped_key(puuid, season))
+    if data is not None:
+        return data
     try:
-        res = table.get_item(Key={"puuid": puuid, "season": season})
-        if "Item" in res:
+        item = await asyncio.to_thread(_get_item, puuid, season)
+        if item:
             print(f"[CACHE:DDB] ✅ Found cached wrapped for {puuid}")
-            return json.loads(res["Item"]["data"])
+            data = _payload_from_item(item)
+            hot.set(wrapped_key(puuid, season), data)
+            if "roast_summary" in item:
+                hot.set(roast_key(puuid, season), EncodedPayload(raw=item["roast_summary"].encode("utf-8")))
+            return data
     except ClientError as e:
         print(f"[CACHE:DDB] ⚠️ Error fetching cache: {e}")
     return None
 
 def put_cached_wrapped(puuid: str, data: dict, season: str = "2025", region: str = None, roast_summary: dict = None):
-    """Store wrapped data result, optionally with roast summary."""
-    try:
-        item = {
-            "puuid": puuid,
-            "season": season,
-            "region": region,
-            "data": json.dumps(data),
-            "updated_at": int(time.time())
-        }
+    """Queue wrapped data result (optionally with roast summary) for a write-behind put."""
+    payload = EncodedPayload.from_obj(data)
+    item = {
+        "puuid": puuid,
+        "season": season,
+        "region": region,
+        # gzip keeps large profiles well under the 400 KB item limit, and is served as-is
+        "data": payload.gzip,
+        "data_encoding": "gzip",
+        # content hash, served as the ETag without touching `data`
+        "etag": payload.etag,
+        "updated_at": int(time.time())
+    }
+    payload.updated_at = item["updated_at"]
 
-        if roast_summary:
-            item["roast_summary"] = json.dumps(roast_summary)
+    items = [item]
+    roast = None
+    if roast_summary:
+        roast = EncodedPayload.from_obj(roast_summary)
+        item["roast_summary"] = roast.raw.decode("utf-8")
+        items.append(_roast_item(puuid, season, roast, item["updated_at"]))
+    else:
+        # drop the previous build's roast item so it isn't served as this one's
+        items.append({"puuid": puuid, "season": roast_season(season), DELETED: True})
+    _enqueue(items)
+    hot.set(wrapped_key(puuid, season), payload)
+    if roast is not None:
+        hot.set(roast_key(puuid, season), roast)
+    else:
+        hot.invalidate(roast_key(puuid, season))
+    print(f"[CACHE:DDB] 📝 Queued wrapped for {puuid} ({len(payload.raw) // 1024} KB, "
+          f"{len(payload.gzip) // 1024} KB gzip, roast_summary={'yes' if roast_summary else 'no'})")
 
-        table.put_item(Item=item)
-        print(f"[CACHE:DDB] 💾 Stored wrapped for {puuid} (roast_summary={'yes' if roast_summary else 'no'})")
-
-    except ClientError as e:
-        print(f"[CACHE:DDB] ❌ Error saving cache: {e}")
-
-def get_roast_summary(puuid: str, season: str = "2025"):
+async def get_roast_summary(puuid: str, season: str = "2025") -> EncodedPayload | None:
+    """Roast summary as an EncodedPayload (see get_cached_wrapped)."""
+    data = hot.get(roast_key(puuid, season))
+    if data is not None:
+        return data
     try:
-        res = table.get_item(Key={"puuid": puuid, "season": season})
-        if "Item" in res and "roast_summary" in res["Item"]:
-            return json.loads(res["Item"]["roast_summary"])
+        item = await asyncio.to_thread(_get_roast_item, puuid, season)
+        if item and "roast_summary" in item:
+            data = _roast_from_item(item)
+            hot.set(roast_key(puuid, season), data)
+            return data
     except ClientError as e:
         print(f"[CACHE:DDB] ⚠️ Error fetching roast summary: {e}")
     return None
+
+
+async def get_roast_summaries(puuids: list[str], season: str = "2025") -> dict:
+    """Roast summaries for many players: hot tier first, the rest in batch_get_item calls."""
+    out, missing = {}, []
+    for puuid in puuids:
+        data = hot.get(roast_key(puuid, season))
+        if data is not None:
+            out[puuid] = data.obj()
+        else:
+            missing.append(puuid)
+    if not missing:
+        return out
+    try:
+        items = await asyncio.to_thread(_batch_get_roasts, missing, season)
+    except ClientError as e:
+        print(f"[CACHE:DDB] ⚠️ Error batch fetching roast summaries: {e}")
+        return out
+    for puuid, item in items.items():
+        if "roast_summary" in item:
+            data = _roast_from_item(item)
+            out[puuid] = data.obj()
+            hot.set(roast_key(puuid, season), data)
+    return out
+
+
+def snapshot() -> dict:
+    return {**stats, "pending": _queue.unfinished_tasks, "backend": DDB_BACKEND}
@@ -1,3 +1,27 @@
+import asyncio
+import json
+import os
+import time
+from types import MappingProxyType
+
+import aiohttp
+
+from app.services.http_client import http
+# --------------------------------------------------------------------
+# DDragon champion metadata
+#
+# Loaded once at startup (from the on-disk snapshot first, so a restart
+# while ddragon is unreachable still has data), then refreshed in the
+# background whenever a new patch is published. Requests read the current
+# indexes without any network I/O.
+# --------------------------------------------------------------------
+DDRAGON_SNAPSHOT = os.getenv("DDRAGON_SNAPSHOT", "ddragon.json")
+DDRAGON_REFRESH_INTERVAL = int(os.getenv("DDRAGON_REFRESH_INTERVAL", 3600))
+DDRAGON_LANG = os.getenv("DDRAGON_LANG", "en_US")
+# How long startup waits for a first load when there is no snapshot yet
+DDRAGON_STARTUP_TIMEOUT = float(os.getenv("DDRAGON_STARTUP_TIMEOUT", 10))
+
+
 async def get_latest_patch(session):
     url = "https://ddragon.leagueoflegends.com/api/versions.json"
     async with session.get(url) as r:
@@ -17,3 +41,131 @@ async def get_champions(session, patch: str, lang: str = "en_US"):
         by_name[name] = info  # includes "tags", "key" (numeric string), etc.
         key_to_name[info["key"]] = name
     return by_name, key_to_name
+
+
+class ChampionMetadata:
+    """
+    Shared, read-only champion indexes for the current patch.
+
+    `current()` returns one consistent (patch, by_name, key_to_name) view;
+    a refresh swaps in a new view instead of mutating the old one.
+    """
+
+    def __init__(self, snapshot_path: str = DDRAGON_SNAPSHOT, lang: str = DDRAGON_LANG):
+        self.snapshot_path = snapshot_path
+        self.lang = lang
+        self._view = (None, MappingProxyType({}), MappingProxyType({}))
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self.last_refresh = None
+        self.last_error = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._view[0] is not None
+
+    @property
+    def patch(self) -> str | None:
+        return self._view[0]
+
+    @property
+    def by_name(self):
+        return self._view[1]
+
+    @property
+    def key_to_name(self):
+        return self._view[2]
+
+    def current(self) -> tuple:
+        return self._view
+
+    def _install(self, patch: str, by_name: dict, key_to_name: dict):
+        self._view = (patch, MappingProxyType(by_name), MappingProxyType(key_to_name))
+
+    def load_snapshot(self) -> bool:
+        try:
+            with open(self.snapshot_path) as f:
+                snap = json.load(f)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"[DDRAGON] ⚠️ Unreadable snapshot {self.snapshot_path}: {e}")
+            return False
+        by_name = snap["champions"]
+        self._install(snap["patch"], by_name, {info["key"]: name for name, info in by_name.items()})
+        print(f"[DDRAGON] 📦 Loaded snapshot for patch {snap['patch']} ({len(by_name)} champions)")
+        return True
+
+    def _save_snapshot(self, patch: str, by_name: dict):
+        tmp = self.snapshot_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"patch": patch, "lang": self.lang, "champions": by_name}, f)
+        os.replace(tmp, self.snapshot_path)
+
+    async def refresh(self, session: aiohttp.ClientSession | None = None) -> bool:
+        """Fetch champion data if ddragon has a newer patch. Returns True if the view changed."""
+        async with self._lock:
+            return await self._refresh(session or http.session)
+
+    async def _refresh(self, session) -> bool:
+        patch = await get_latest_patch(session)
+        if patch == self.patch:
+            return False
+        by_name, key_to_name = await get_champions(session, patch, self.lang)
+        self._install(patch, by_name, key_to_name)
+        print(f"[DDRAGON] ✔️ Patch {patch} loaded ({len(by_name)} champions)")
+        try:
+            await asyncio.to_thread(self._save_snapshot, patch, by_name)
+        except OSError as e:
+            print(f"[DDRAGON] ⚠️ Could not write snapshot: {e}")
+        return True
+
+    async def ensure_loaded(self):
+        """For callers that need data even if startup couldn't load any."""
+        if not self.loaded:
+            await self.refresh()
+
+    async def start(self):
+        """Load the snapshot (or, without one, wait briefly for ddragon), then refresh in the background."""
+        if self.load_snapshot():
+            delay = 0  # the snapshot may be a patch behind: check right away
+        else:
+            try:
+                await asyncio.wait_for(self.refresh(), DDRAGON_STARTUP_TIMEOUT)
+                self.last_refresh = time.time()
+                delay = DDRAGON_REFRESH_INTERVAL
+            except Exception as e:
+                self.last_error = str(e) or type(e).__name__
+                print(f"[DDRAGON] ⚠️ Initial load failed, will retry in background: {self.last_error}")
+                delay = 60
+        self._task = asyncio.create_task(self._refresh_loop(delay))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _refresh_loop(self, delay: float):
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self.refresh()
+                self.last_refresh = time.time()
+                self.last_error = None
+                delay = DDRAGON_REFRESH_INTERVAL
+            except Exception as e:
+                self.last_error = str(e) or type(e).__name__
+                print(f"[DDRAGON] ⚠️ Refresh failed: {self.last_error}")
+                delay = 60 if not self.loaded else DDRAGON_REFRESH_INTERVAL
+
+    def snapshot(self) -> dict:
+        return {
+            "patch": self.patch,
+            "champions": len(self.by_name),
+            "last_refresh": self.last_refresh,
+            "last_error": self.last_error,
+        }
+
+
+champions = ChampionMetadata()
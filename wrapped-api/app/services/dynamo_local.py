@@ -0,0 +1,79 @@
+import copy
+import threading
+
+# --------------------------------------------------------------------
+# In-memory DynamoDB stand-in (DDB_BACKEND=memory)
+#
+# Implements just the slice of the boto3 Table/resource API that
+# cache_dynamo uses, so the API runs locally and in tests without AWS.
+# For wire-level compatibility use DynamoDB Local via DDB_ENDPOINT_URL.
+# --------------------------------------------------------------------
+
+
+class MemoryTable:
+    def __init__(self, name: str, key_schema: tuple = ("puuid", "season")):
+        self.name = name
+        self.key_schema = key_schema
+        self._items: dict[tuple, dict] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, key: dict) -> tuple:
+        return tuple(key[k] for k in self.key_schema)
+
+    def get_item(self, Key: dict, **kwargs) -> dict:
+        with self._lock:
+            item = self._items.get(self._key(Key))
+        if item is None:
+            return {}
+        return {"Item": copy.deepcopy(item)}
+
+    def put_item(self, Item: dict, **kwargs) -> dict:
+        with self._lock:
+            self._items[self._key(Item)] = copy.deepcopy(Item)
+        return {}
+
+    def delete_item(self, Key: dict, **kwargs) -> dict:
+        with self._lock:
+            self._items.pop(self._key(Key), None)
+        return {}
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return _MemoryBatchWriter(self)
+
+
+class _MemoryBatchWriter:
+    def __init__(self, table: MemoryTable):
+        self.table = table
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def put_item(self, Item: dict):
+        self.table.put_item(Item=Item)
+
+    def delete_item(self, Key: dict):
+        self.table.delete_item(Key=Key)
+
+
+class MemoryResource:
+    """Stands in for boto3.resource("dynamodb")."""
+
+    def __init__(self):
+        self.tables: dict[str, MemoryTable] = {}
+
+    def Table(self, name: str) -> MemoryTable:
+        if name not in self.tables:
+            self.tables[name] = MemoryTable(name)
+        return self.tables[name]
+
+    def batch_get_item(self, RequestItems: dict) -> dict:
+        responses = {}
+        for name, req in RequestItems.items():
+            table = self.Table(name)
+            responses[name] = [
+                res["Item"] for res in (table.get_item(Key=key) for key in req["Keys"]) if "Item" in res
+            ]
+        return {"Responses": responses, "UnprocessedKeys": {}}
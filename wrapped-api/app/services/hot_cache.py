@@ -0,0 +1,77 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Bounded in-process tier in front of DynamoDB for small, hot response payloads
+HOT_CACHE_SIZE = int(os.getenv("HOT_CACHE_SIZE", 512))
+# Default entry lifetime; also bounds staleness across processes, since
+# invalidate() only reaches this process
+HOT_CACHE_TTL = int(os.getenv("HOT_CACHE_TTL", 600))
+
+
+class HotCache:
+    """
+    LRU dict with per-entry TTL. Values are shared, not copied — callers must
+    treat what they get back as read-only. Safe to use from worker threads
+    (to_thread callers) as well as the event loop.
+    """
+
+    def __init__(self, max_entries: int = HOT_CACHE_SIZE, ttl: int = HOT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple] = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evicted": 0, "invalidated": 0}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                self.stats["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self.stats["hits"] += 1
+            return value
+
+    def set(self, key: str, value, ttl: int | None = None):
+        if value is None:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + (ttl or self.ttl))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.stats["evicted"] += 1
+
+    def invalidate(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                if self._data.pop(key, None) is not None:
+                    self.stats["invalidated"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "entries": len(self._data), "max_entries": self.max_entries}
+
+
+hot = HotCache()
+
+
+# ---- key helpers shared by the tiers behind it ----
+def wrapped_key(puuid: str, season: str) -> str:
+    return f"wrapped:{puuid}:{season}"
+
+
+def roast_key(puuid: str, season: str) -> str:
+    return f"roast:{puuid}:{season}"
+
+
+def invalidate_wrapped(puuid: str, season: str = "2025"):
+    """Drop everything derived from a player's wrapped; call when it is recomputed."""
+    hot.invalidate(wrapped_key(puuid, season), roast_key(puuid, season))
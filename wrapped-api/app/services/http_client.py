@@ -0,0 +1,106 @@
+import asyncio
+import os
+
+import aiohttp
+
+# --------------------------------------------------------------------
+# Shared HTTP client
+#
+# One ClientSession for the lifetime of the app (opened/closed by the
+# startup/shutdown hooks in main.py), so keep-alive connections, DNS
+# lookups and TLS sessions to *.api.riotgames.com and ddragon are reused
+# across wrapped requests instead of being rebuilt for each one.
+# --------------------------------------------------------------------
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", 100))
+# Riot hosts are rate limited anyway; this caps sockets per regional host
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", 30))
+HTTP_DNS_TTL = int(os.getenv("HTTP_DNS_TTL", 300))
+# Idle keep-alive connections are closed after this many seconds
+HTTP_KEEPALIVE = float(os.getenv("HTTP_KEEPALIVE", 60))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 30))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 10))
+
+
+class HttpClient:
+    """
+    Owner of the app-wide aiohttp session. `session` opens one lazily when the
+    app hasn't started it (scripts, CLIs), bound to the running event loop.
+    """
+
+    def __init__(self):
+        self._session: aiohttp.ClientSession | None = None
+        self._loop = None
+        self.stats = {
+            "sessions": 0,
+            "requests": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "dns_cache_hits": 0,
+            "dns_cache_misses": 0,
+        }
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+
+        def count(stat):
+            async def hook(session, ctx, params):
+                self.stats[stat] += 1
+            return hook
+
+        trace.on_request_start.append(count("requests"))
+        trace.on_connection_create_end.append(count("connections_created"))
+        trace.on_connection_reuseconn.append(count("connections_reused"))
+        trace.on_dns_cache_hit.append(count("dns_cache_hits"))
+        trace.on_dns_cache_miss.append(count("dns_cache_misses"))
+        return trace
+
+    def _open(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+            ttl_dns_cache=HTTP_DNS_TTL,
+            keepalive_timeout=HTTP_KEEPALIVE,
+        )
+        self._loop = asyncio.get_running_loop()
+        self.stats["sessions"] += 1
+        print(f"[HTTP] 🔌 Opened shared session (limit={HTTP_POOL_LIMIT}, per_host={HTTP_POOL_LIMIT_PER_HOST})")
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            raise_for_status=False,
+            trace_configs=[self._trace_config()],
+        )
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed or self._loop is not asyncio.get_running_loop():
+            self._session = self._open()
+        return self._session
+
+    async def start(self):
+        self.session
+
+    async def stop(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            print("[HTTP] 🔌 Closed shared session")
+        self._session = None
+
+    def snapshot(self) -> dict:
+        pool = {}
+        connector = self._session.connector if self._session is not None and not self._session.closed else None
+        if connector is not None:
+            # aiohttp has no public pool counters; these are best effort
+            acquired = getattr(connector, "_acquired", ())
+            idle = getattr(connector, "_conns", {})
+            pool = {
+                "in_use": len(acquired),
+                "idle": sum(len(conns) for conns in idle.values()),
+                "idle_by_host": {f"{key.host}:{key.port}": len(conns) for key, conns in idle.items()},
+                "limit": connector.limit,
+                "limit_per_host": connector.limit_per_host,
+            }
+        return {**self.stats, "open": connector is not None, **pool}
+
+
+http = HttpClient()
@@ -0,0 +1,139 @@
+import asyncio
+import os
+import time
+import uuid
+
+# Max wrapped pipelines running at once (each one drives its own Riot fetches)
+WRAPPED_WORKERS = int(os.getenv("WRAPPED_WORKERS", 2))
+# How long finished jobs stay around for status polling
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", 3600))
+
+
+class Job:
+    """One queued generation; `progress` is updated in place by the job function."""
+
+    def __init__(self, key: tuple, fn, args: tuple, kwargs: dict):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = "queued"
+        self.progress = {"stage": "queued", "total": 0, "fetched": 0, "parsed": 0}
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = asyncio.get_running_loop().create_future()
+        # nobody may be awaiting the result (POST + polling) — don't warn about it
+        self.future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._call = (fn, args, kwargs)
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "key": list(self.key),
+            "status": self.status,
+            "progress": dict(self.progress),
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """
+    Bounded worker pool for long-running generations.
+
+    Jobs are keyed (e.g. (puuid, season)); submitting a key that already has a
+    queued/running job returns that job instead of starting a duplicate.
+    """
+
+    def __init__(self, workers: int = WRAPPED_WORKERS, name: str = "wrapped"):
+        self.workers = workers
+        self.name = name
+        self.queue: asyncio.Queue | None = None
+        self.jobs: dict[str, Job] = {}
+        self.by_key: dict[tuple, Job] = {}
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        print(f"[JOBS] 🧵 Started {self.workers} {self.name} workers")
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def get(self, job_id: str) -> Job | None:
+        return self.jobs.get(job_id)
+
+    def find(self, key: tuple) -> Job | None:
+        job = self.by_key.get(key)
+        return job if job and job.active else None
+
+    def submit(self, key: tuple, fn, *args, **kwargs) -> Job:
+        """Enqueue `fn(*args, progress=..., **kwargs)` unless `key` is already in flight."""
+        if self.queue is None:
+            self.start()
+        self._prune()
+
+        existing = self.find(key)
+        if existing:
+            print(f"[JOBS] 🔗 Attached to running job {existing.id} for {key}")
+            return existing
+
+        job = Job(key, fn, args, kwargs)
+        self.jobs[job.id] = job
+        self.by_key[key] = job
+        self.queue.put_nowait(job)
+        print(f"[JOBS] ➕ Queued job {job.id} for {key} (queue={self.queue.qsize()})")
+        return job
+
+    def stats(self) -> dict:
+        by_status = {}
+        for job in self.jobs.values():
+            by_status[job.status] = by_status.get(job.status, 0) + 1
+        return {"workers": self.workers, "queued": self.queue.qsize() if self.queue else 0, **by_status}
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION
+        for job_id, job in list(self.jobs.items()):
+            if job.finished_at and job.finished_at < cutoff:
+                del self.jobs[job_id]
+                if self.by_key.get(job.key) is job:
+                    del self.by_key[job.key]
+
+    async def _worker(self, n: int):
+        while True:
+            job = await self.queue.get()
+            fn, args, kwargs = job._call
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                result = await fn(*args, progress=job.progress, **kwargs)
+                job.status = "done"
+                job.future.set_result(result)
+            except asyncio.CancelledError:
+                job.status = "cancelled"
+                job.future.cancel()
+                raise
+            except Exception as e:
+                job.status = "failed"
+                job.error = getattr(e, "detail", None) or str(e)
+                job.future.set_exception(e)
+                print(f"[JOBS] ❌ Job {job.id} failed: {job.error}")
+            finally:
+                job.finished_at = time.time()
+                job.progress["stage"] = job.status
+                self.queue.task_done()
+
+
+jobs = JobQueue()
+# Pre-warm batches: one at a time, each feeding its players into `jobs`
+batches = JobQueue(workers=1, name="prewarm")
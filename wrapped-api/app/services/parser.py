@@ -1,9 +1,63 @@
 from collections import Counter
 
+# Bump whenever extract_stats output changes so cached parsed rows get rebuilt
+PARSER_VERSION = 2
+
 def _safe_div(n, d):
     return n / d if d else 0.0
 
 
+def _scan_timeline(timeline) -> dict | None:
+    """
+    Single pass over the timeline events, bucketed by killer participantId:
+    {participantId: {"dragon_types", "elder_dragons", "killstreaks_ended", "bounty_collected"}}
+    Returns None when there is no timeline to scan.
+    """
+    if not timeline or "info" not in timeline:
+        return None
+
+    out = {}
+
+    def bucket(pid):
+        if pid not in out:
+            out[pid] = {"dragon_types": Counter(), "elder_dragons": 0, "killstreaks_ended": 0, "bounty_collected": 0}
+        return out[pid]
+
+    for frame in timeline["info"].get("frames", []):
+        for e in frame.get("events", []):
+            etype = e.get("type")
+            if etype == "ELITE_MONSTER_KILL" and e.get("monsterType") == "DRAGON":
+                b = bucket(e.get("killerId"))
+                subtype = e.get("monsterSubType", "UNKNOWN")
+                if subtype == "ELDER_DRAGON":
+                    b["elder_dragons"] += 1
+                b["dragon_types"][subtype] += 1
+            elif etype == "CHAMPION_KILL":
+                bounty = e.get("shutdownBounty", 0)
+                if bounty > 0:
+                    b = bucket(e.get("killerId"))
+                    b["killstreaks_ended"] += 1
+                    b["bounty_collected"] += bounty
+    return out
+
+
+def extract_match_stats(match, timeline) -> dict:
+    """
+    Match-level extract: walks the timeline once and returns the
+    extract_stats row for every participant, keyed by puuid.
+    """
+    if not match or "info" not in match:
+        return {}
+
+    info = match["info"]
+    scanned = _scan_timeline(timeline)
+    return {
+        p["puuid"]: _participant_stats(info, p, scanned)
+        for p in info.get("participants", [])
+        if p.get("puuid")
+    }
+
+
 def extract_stats(match, timeline, puuid):
     """
     Per-match extract that powers everything downstream.
@@ -17,6 +71,11 @@ def extract_stats(match, timeline, puuid):
     if not me:
         return None
 
+    return _participant_stats(info, me, _scan_timeline(timeline))
+
+
+def _participant_stats(info, me, scanned: dict | None):
+    parts = info.get("participants", [])
     duration_s = info.get("gameDuration", 0)
     end_ts = info.get("gameEndTimestamp") or info.get("gameCreation", 0)
     my_team = me.get("teamId")
@@ -24,26 +83,20 @@ def extract_stats(match, timeline, puuid):
 
     ch = me.get("challenges", {}) or {}
 
-    dragon_types = Counter()
-    elder_drags = 0
-    killstreaks_ended = 0
-    bounty_collected = 0
-
-    # 🕒 Parse timeline events
-    if timeline and "info" in timeline:
-        my_pid = me.get("participantId")
-        for frame in timeline["info"].get("frames", []):
-            for e in frame.get("events", []):
-                if e.get("type") == "ELITE_MONSTER_KILL" and e.get("killerId") == my_pid and e.get("monsterType") == "DRAGON":
-                    subtype = e.get("monsterSubType", "UNKNOWN")
-                    if subtype == "ELDER_DRAGON":
-                        elder_drags += 1
-                    dragon_types[subtype] += 1
-                if e.get("type") == "CHAMPION_KILL" and e.get("killerId") == my_pid:
-                    b = e.get("shutdownBounty", 0)
-                    if b > 0:
-                        killstreaks_ended += 1
-                        bounty_collected += b
+    # 🕒 Timeline-derived stats
+    if scanned is not None:
+        tl = scanned.get(me.get("participantId"), {})
+        dragon_types = tl.get("dragon_types", Counter())
+        elder_drags = tl.get("elder_dragons", 0)
+        killstreaks_ended = tl.get("killstreaks_ended", 0)
+        bounty_collected = tl.get("bounty_collected", 0)
+    else:
+        # fast mode: no timeline, so these weren't computed (None, not 0); the
+        # bountyGold challenge is not the shutdown bounty, so it's no stand-in
+        dragon_types = None
+        elder_drags = None
+        killstreaks_ended = None
+        bounty_collected = None
 
     # 🧮 Derived stats
     cs = me.get("totalMinionsKilled", 0) + me.get("neutralMinionsKilled", 0)
@@ -132,9 +185,10 @@ def extract_stats(match, timeline, puuid):
         "teamKills": team_kills,
         "killParticipation": _safe_div(me.get("kills", 0) + me.get("assists", 0), team_kills) if team_kills else 0.0,
 
-        "dragon_types": dict(dragon_types),
+        "dragon_types": dict(dragon_types) if dragon_types is not None else None,
         "killstreaks_ended": killstreaks_ended,
         "bounty_collected": bounty_collected,
+        "detail": "full" if scanned is not None else "fast",
 
         "gameEndedInEarlySurrender": info.get("gameEndedInEarlySurrender", False),
         "gameEndedInSurrender": info.get("gameEndedInSurrender", False),
@@ -0,0 +1,107 @@
+import os
+
+# --------------------------------------------------------------------
+# Ingest-time projection
+#
+# Strips Riot match/timeline payloads down to the fields the parser (and
+# the admin/index tooling) actually reads before they are cached. Projected
+# payloads carry PROJECTION_VERSION; bump it whenever a schema below grows so
+# stale projections are re-fetched (or re-projected from the raw archive).
+# --------------------------------------------------------------------
+PROJECTION_VERSION = 1
+
+CACHE_PROJECTION = os.getenv("CACHE_PROJECTION", "1") == "1"
+# Also keep the untouched payload under raw:<key>, so a grown schema can be
+# re-projected locally instead of re-fetched from Riot
+CACHE_RAW_ARCHIVE = os.getenv("CACHE_RAW_ARCHIVE", "0") == "1"
+
+KEEP = True
+
+PARTICIPANT_SCHEMA = {
+    field: KEEP for field in [
+        "puuid", "participantId", "teamId", "summonerName", "championName", "teamPosition", "win",
+        "kills", "deaths", "assists", "doubleKills", "tripleKills", "quadraKills", "pentaKills",
+        "largestKillingSpree", "longestKillingSpree", "firstBloodKill",
+        "baronKills", "dragonKills", "turretTakedowns", "inhibitorTakedowns",
+        "visionScore", "wardsPlaced", "wardsKilled", "controlWardsPlaced",
+        "totalMinionsKilled", "neutralMinionsKilled", "goldEarned", "goldSpent",
+        "totalDamageDealtToChampions", "totalDamageTaken", "totalTimeSpentDead",
+    ]
+}
+PARTICIPANT_SCHEMA["challenges"] = {
+    field: KEEP for field in [
+        "goldPerMinute", "damagePerMinute", "riftHeraldTakedowns",
+        "turretPlatesTaken", "soloKills", "bountyGold",
+    ]
+}
+
+MATCH_SCHEMA = {
+    "metadata": {"matchId": KEEP, "participants": KEEP},
+    "info": {
+        "gameCreation": KEEP,
+        "gameStartTimestamp": KEEP,
+        "gameEndTimestamp": KEEP,
+        "gameDuration": KEEP,
+        "gameEndedInEarlySurrender": KEEP,
+        "gameEndedInSurrender": KEEP,
+        "queueId": KEEP,
+        "participants": [PARTICIPANT_SCHEMA],
+        "teams": [{"teamId": KEEP, "win": KEEP}],
+    },
+}
+
+# Timeline events the parser reads, and the fields it needs from each
+TIMELINE_EVENTS = {
+    "ELITE_MONSTER_KILL": ("type", "killerId", "monsterType", "monsterSubType"),
+    "CHAMPION_KILL": ("type", "killerId", "shutdownBounty"),
+}
+
+
+def project(obj, schema):
+    """Keep only the parts of `obj` described by `schema` (KEEP / nested dict / [item schema])."""
+    if schema is KEEP or obj is None:
+        return obj
+    if isinstance(schema, list):
+        return [project(item, schema[0]) for item in obj] if isinstance(obj, list) else obj
+    if not isinstance(obj, dict):
+        return obj
+    return {k: project(obj[k], sub) for k, sub in schema.items() if k in obj}
+
+
+def project_match(match: dict) -> dict:
+    out = project(match, MATCH_SCHEMA)
+    out["_projection"] = PROJECTION_VERSION
+    return out
+
+
+def project_timeline(timeline: dict) -> dict:
+    frames = []
+    for frame in (timeline.get("info") or {}).get("frames", []):
+        events = [
+            {k: e[k] for k in TIMELINE_EVENTS[e.get("type")] if k in e}
+            for e in frame.get("events", [])
+            if e.get("type") in TIMELINE_EVENTS
+        ]
+        if events:
+            frames.append({"events": events})
+    return {
+        "metadata": project(timeline.get("metadata"), {"matchId": KEEP}),
+        "info": {"frames": frames},
+        "_projection": PROJECTION_VERSION,
+    }
+
+
+def is_current(data) -> bool:
+    """Raw payloads (no marker) are a superset of any schema; projections must match the version."""
+    return "_projection" not in data or data["_projection"] == PROJECTION_VERSION
+
+
+def for_key(key: str):
+    """Projection function for a cache key, or None to store the payload as-is."""
+    if not CACHE_PROJECTION:
+        return None
+    if key.startswith("match:"):
+        return project_match
+    if key.startswith("timeline:"):
+        return project_timeline
+    return None
@@ -0,0 +1,180 @@
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+# Budget assumed for a host until Riot tells us otherwise (dev/personal key defaults)
+DEFAULT_APP_LIMIT = os.getenv("RIOT_APP_RATE_LIMIT", "20:1,100:120")
+DEFAULT_RETRY_AFTER = 1.0
+
+
+def parse_limits(header: str | None) -> list[tuple[int, int]]:
+    """Parse a Riot limit header like '20:1,100:120' into [(limit, period_s), ...]."""
+    out = []
+    for part in (header or "").split(","):
+        try:
+            n, period = part.strip().split(":")
+            out.append((int(n), int(period)))
+        except ValueError:
+            continue
+    return out
+
+
+def host_key(url: str) -> str:
+    """'https://na1.api.riotgames.com/...' -> 'na1' (routing or platform host)."""
+    host = urlsplit(url).hostname or ""
+    return host.split(".")[0]
+
+
+class _Window:
+    """Sliding-window log for one (limit, period) pair."""
+
+    def __init__(self, limit: int, period: int):
+        self.limit = limit
+        self.period = period
+        self.log = deque()
+
+    def _trim(self, now: float):
+        while self.log and now - self.log[0] >= self.period:
+            self.log.popleft()
+
+    def wait_time(self, now: float) -> float:
+        self._trim(now)
+        if len(self.log) < self.limit:
+            return 0.0
+        return self.log[0] + self.period - now
+
+    def used(self, now: float) -> float:
+        self._trim(now)
+        return len(self.log) / self.limit if self.limit else 0.0
+
+    def sync_count(self, count: int, now: float):
+        """Riot saw more calls in this window than we did (other workers, restarts) — catch up."""
+        self._trim(now)
+        for _ in range(count - len(self.log)):
+            self.log.append(now)
+
+
+class _Bucket:
+    """All windows for one scope (a host's app limit, or one method on a host)."""
+
+    def __init__(self, limits: list[tuple[int, int]]):
+        self.windows = [_Window(n, p) for n, p in limits]
+        self.blocked_until = 0.0
+
+    def wait_time(self, now: float) -> float:
+        wait = self.blocked_until - now
+        for w in self.windows:
+            wait = max(wait, w.wait_time(now))
+        return wait
+
+    def used(self, now: float) -> float:
+        """Share of the fullest window in use (1.0 while blocked by a 429)."""
+        if self.blocked_until > now:
+            return 1.0
+        return max((w.used(now) for w in self.windows), default=0.0)
+
+    def record(self, now: float):
+        for w in self.windows:
+            w.log.append(now)
+
+    def adapt(self, limit_header: str | None, count_header: str | None, now: float):
+        limits = parse_limits(limit_header)
+        if limits and limits != [(w.limit, w.period) for w in self.windows]:
+            old = {w.period: w.log for w in self.windows}
+            self.windows = [_Window(n, p) for n, p in limits]
+            for w in self.windows:
+                w.log = old.get(w.period, deque())
+
+        counts = dict((p, n) for n, p in parse_limits(count_header))
+        for w in self.windows:
+            if w.period in counts:
+                w.sync_count(counts[w.period], now)
+
+
+class RiotRateLimiter:
+    """
+    One scheduler in front of every outbound Riot call.
+
+    Keeps an app-limit bucket per routing/platform host (americas, europe, na1, euw1, ...)
+    and a method-limit bucket per (host, method). Limits start from DEFAULT_APP_LIMIT and
+    are replaced by whatever X-App-Rate-Limit / X-Method-Rate-Limit report, with the
+    -Count headers used to catch up on calls we didn't see. A 429 blocks the affected
+    bucket once for every waiter instead of each coroutine sleeping on its own.
+    """
+
+    def __init__(self, default_app_limit: str = DEFAULT_APP_LIMIT):
+        self.default_app_limits = parse_limits(default_app_limit)
+        self.app: dict[str, _Bucket] = {}
+        self.methods: dict[tuple[str, str], _Bucket] = {}
+        self.stats = {"requests": 0, "throttled": 0, "rate_limited": 0}
+
+    def _buckets(self, host: str, method: str) -> tuple[_Bucket, _Bucket]:
+        if host not in self.app:
+            self.app[host] = _Bucket(self.default_app_limits)
+        if (host, method) not in self.methods:
+            # no method limit known until Riot reports one
+            self.methods[(host, method)] = _Bucket([])
+        return self.app[host], self.methods[(host, method)]
+
+    async def acquire(self, host: str, method: str):
+        """Wait until both the app and method budget for this host allow one more call."""
+        app, meth = self._buckets(host, method)
+        throttled = False
+        while True:
+            now = time.monotonic()
+            wait = max(app.wait_time(now), meth.wait_time(now))
+            if wait <= 0:
+                app.record(now)
+                meth.record(now)
+                self.stats["requests"] += 1
+                self.stats["throttled"] += throttled
+                return
+            throttled = True
+            await asyncio.sleep(wait)
+
+    def utilization(self, host: str) -> float:
+        """How much of a host's app budget is in use right now (0 for hosts not called yet)."""
+        bucket = self.app.get(host)
+        return bucket.used(time.monotonic()) if bucket else 0.0
+
+    def update(self, host: str, method: str, headers):
+        """Adapt buckets to the limits and counts Riot reported on a response."""
+        app, meth = self._buckets(host, method)
+        now = time.monotonic()
+        app.adapt(headers.get("X-App-Rate-Limit"), headers.get("X-App-Rate-Limit-Count"), now)
+        meth.adapt(headers.get("X-Method-Rate-Limit"), headers.get("X-Method-Rate-Limit-Count"), now)
+
+    def backoff(self, host: str, method: str, headers):
+        """Honour a 429 once for all waiters on the affected bucket."""
+        app, meth = self._buckets(host, method)
+        try:
+            retry_after = float(headers.get("Retry-After", DEFAULT_RETRY_AFTER))
+        except ValueError:
+            retry_after = DEFAULT_RETRY_AFTER
+        bucket = meth if headers.get("X-Rate-Limit-Type") == "method" else app
+        bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + retry_after)
+        self.stats["rate_limited"] += 1
+        print(f"[RATE_LIMIT] ⏳ 429 on {host} ({method}), pausing {retry_after:.1f}s")
+
+    @asynccontextmanager
+    async def get(self, session, url: str, method: str, retries: int = 3, **kwargs):
+        """
+        Rate-limited session.get(). Retries 429s (after the shared backoff) and
+        yields the first non-429 response, or the last 429 once retries run out.
+        """
+        host = host_key(url)
+        for attempt in range(retries + 1):
+            await self.acquire(host, method)
+            async with session.get(url, **kwargs) as resp:
+                self.update(host, method, resp.headers)
+                if resp.status == 429 and attempt < retries:
+                    self.backoff(host, method, resp.headers)
+                    continue
+                yield resp
+                return
+
+
+limiter = RiotRateLimiter()
@@ -8,6 +8,12 @@ from dotenv import load_dotenv
 
 import aiohttp
 
+from app.services import cache as index_store
+from app.services.http_client import http
+from app.services.rate_limiter import limiter
+from app.services.riot_fetcher import cached_call
+from app.services.singleflight import flights
+
 load_dotenv()
 
 def get_api_key() -> str:
@@ -18,13 +24,10 @@ def get_api_key() -> str:
 
 RIOT_API_KEY = get_api_key()
 
-# conservative concurrency to respect 20 rps / 100 per 120s
-_SEM = asyncio.Semaphore(5)
-
 @asynccontextmanager
 async def session_ctx():
-    async with aiohttp.ClientSession(raise_for_status=False) as s:
-        yield s
+    # the app-wide pooled session; it outlives this block and is closed on shutdown
+    yield http.session
 
 def to_unix(dt_str: str) -> int:
     """Accepts 'YYYY-MM-DD' or RFC3339; returns UNIX seconds (UTC)."""
@@ -77,72 +80,241 @@ def platform_host_for_mastery(region: str) -> str:
         return f"{r}.api.riotgames.com"
     return "na1.api.riotgames.com"
 
-async def _fetch_json(session: aiohttp.ClientSession, url: str, params: dict | None = None, retries: int = 5):
-    params = params or {}
-    params["api_key"] = RIOT_API_KEY
+async def _fetch_json(session: aiohttp.ClientSession, url: str, params: dict | None = None, retries: int = 5,
+                      method: str = "default"):
+    # identical in-flight requests (same URL + query) share one Riot call
+    key = url + "?" + "&".join(f"{k}={v}" for k, v in sorted((params or {}).items()))
+    return await flights.do(key, _get_json, session, url, params, retries, method)
+
+async def _get_json(session: aiohttp.ClientSession, url: str, params: dict | None = None, retries: int = 5,
+                    method: str = "default"):
+    params = {**(params or {}), "api_key": RIOT_API_KEY}
     attempt = 0
     while True:
-        async with _SEM:
-            async with session.get(url, params=params) as resp:
-                if resp.status == 200:
-                    return await resp.json()
-                if resp.status == 429:
-                    retry_after = int(resp.headers.get("Retry-After", "2"))
-                    await asyncio.sleep(retry_after)
-                elif 500 <= resp.status < 600:
-                    if attempt >= retries:
-                        return None
-                    await asyncio.sleep(1 + attempt)
-                else:
+        # 429s are retried inside the shared limiter, after its backoff
+        async with limiter.get(session, url, method, retries=retries, params=params) as resp:
+            if resp.status == 200:
+                return await resp.json()
+            if 500 <= resp.status < 600:
+                if attempt >= retries:
                     return None
+                await asyncio.sleep(1 + attempt)
+            else:
+                return None
         attempt += 1
 
-async def fetch_match_ids(session, cluster: str, puuid: str, start_ts: int, end_ts: int, cnt=50):
-    base = f"https://{cluster}.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids"
+MATCH_ID_PAGE = 100  # Riot's max `count` per by-puuid/ids call
 
-    print(base)
-    ids, start, count = [], 0, 100
-    while True:
+
+def month_slices(start_ts: int, end_ts: int) -> list[tuple[int, int]]:
+    """Split [start_ts, end_ts] into calendar-month windows, newest first (Riot's own order)."""
+    slices = []
+    cur = datetime.fromtimestamp(start_ts, tz=timezone.utc)
+    lo = start_ts
+    while lo < end_ts:
+        month_start = cur.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        nxt = month_start.replace(year=month_start.year + month_start.month // 12,
+                                  month=month_start.month % 12 + 1)
+        hi = min(int(nxt.timestamp()), end_ts)
+        slices.append((lo, hi))
+        lo, cur = hi, nxt
+    return slices[::-1] or [(start_ts, end_ts)]
+
+
+async def _slice_pages(session, base: str, start_ts: int, end_ts: int, limit: int | None = None):
+    """
+    Page one time window, newest first; stops at a short page or after `limit` IDs.
+    Raises if a page can't be fetched, so a failed listing never passes for a complete one.
+    """
+    start = 0
+    while limit is None or start < limit:
+        count = MATCH_ID_PAGE if limit is None else min(MATCH_ID_PAGE, limit - start)
         data = await _fetch_json(session, base, {
             "start": start, "count": count,
             "startTime": start_ts, "endTime": end_ts
-        })
-        print(data)
+        }, method="match-v5.getMatchIdsByPUUID")
+        if data is None:
+            raise RuntimeError(f"Listing match IDs failed ({start_ts}-{end_ts}, start={start})")
         if not data:
-            break
-        ids.extend(data)
+            return
+        yield data
         if len(data) < count:
-            break
+            return
         start += count
-        await asyncio.sleep(0.5)
-    return ids[:cnt]
 
-async def fetch_match_and_timeline(session, cluster: str, match_id: str):
-    murl = f"https://{cluster}.api.riotgames.com/lol/match/v5/matches/{match_id}"
-    turl = f"https://{cluster}.api.riotgames.com/lol/match/v5/matches/{match_id}/timeline"
-    match = await _fetch_json(session, murl)
-    timeline = await _fetch_json(session, turl)
-    return match, timeline
+
+async def iter_match_ids(session, cluster: str, puuid: str, start_ts: int, end_ts: int, count: int | None = None):
+    """
+    Yield batches of (order_key, match_id) as pages arrive, with duplicates removed.
+    Sorting on order_key gives Riot's newest-first order.
+
+    Without `count` the window is split into monthly slices that are paged
+    concurrently (the shared rate limiter paces them). With `count`, slices are
+    walked newest first, one at a time, and paging stops once `count` IDs are in.
+    """
+    base = f"https://{cluster}.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids"
+    slices = month_slices(start_ts, end_ts)
+    seen = set()
+
+    def fresh(i: int, offset: int, page: list[str], room: int | None = None):
+        batch = []
+        for j, mid in enumerate(page):
+            if mid not in seen and (room is None or len(batch) < room):
+                seen.add(mid)
+                batch.append(((i, offset + j), mid))
+        return batch
+
+    if count:
+        for i, (lo, hi) in enumerate(slices):
+            offset = 0
+            async for page in _slice_pages(session, base, lo, hi, count - len(seen)):
+                batch = fresh(i, offset, page, count - len(seen))
+                offset += len(page)
+                if batch:
+                    yield batch
+                if len(seen) >= count:
+                    return
+        return
+
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def run(i: int, lo: int, hi: int):
+        offset = 0
+        try:
+            async for page in _slice_pages(session, base, lo, hi):
+                await queue.put((i, offset, page))
+                offset += len(page)
+            await queue.put((i, None, None))
+        except Exception as e:
+            await queue.put((i, None, e))
+
+    tasks = [asyncio.create_task(run(i, lo, hi)) for i, (lo, hi) in enumerate(slices)]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            i, offset, page = await queue.get()
+            if offset is None:
+                remaining -= 1
+                if isinstance(page, Exception):
+                    raise page
+                continue
+            batch = fresh(i, offset, page)
+            if batch:
+                yield batch
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Games are listed once they end but filtered by when they started: re-list a
+# little before the last sync so games in progress at sync time aren't missed
+INDEX_SYNC_OVERLAP = int(os.getenv("MATCH_INDEX_SYNC_OVERLAP", 3 * 3600))
+
+
+def _unsynced(sync: dict | None, start_ts: int, end_ts: int) -> list[tuple[str, int, int]]:
+    """Windows of [start_ts, end_ts] the index doesn't cover yet, newest first."""
+    if not sync:
+        return [("all", start_ts, end_ts)]
+    gaps = []
+    if end_ts > sync["synced_to"]:
+        gaps.append(("newer", sync["synced_to"] - INDEX_SYNC_OVERLAP, end_ts))
+    if start_ts < sync["synced_from"]:
+        gaps.append(("older", start_ts, sync["synced_from"]))
+    return gaps
+
+
+async def iter_indexed_match_ids(session, cluster: str, puuid: str, start_ts: int, end_ts: int,
+                                 count: int | None = None):
+    """
+    iter_match_ids backed by the per-player match index in the cache store.
+
+    Only the parts of the window not synced yet are listed from Riot (normally
+    just the games since the last sync); the rest is a range query over the
+    index. Yields batches of (order_key, match_id); order_key sorts newest first.
+    Without `count`, freshly listed IDs are yielded as their pages arrive.
+    A window only counts as synced once every slice in it was listed without
+    errors; a failed listing raises and leaves it to be listed again next time.
+    """
+    sync = await asyncio.to_thread(index_store.get_match_index_sync, puuid)
+    gaps = _unsynced(sync, start_ts, end_ts)
+    synced_from = sync["synced_from"] if sync else None
+    synced_to = sync["synced_to"] if sync else None
+    yielded = set()
+
+    def key(mid: str) -> int:
+        return -index_store.game_id(mid)
+
+    async def save_sync():
+        unchanged = sync and (sync["synced_from"], sync["synced_to"]) == (synced_from, synced_to)
+        if synced_from is not None and synced_to is not None and not unchanged:
+            await asyncio.to_thread(index_store.set_match_index_sync, puuid, synced_from, synced_to)
+
+    try:
+        for kind, lo, hi in gaps:
+            slices = month_slices(lo, hi)
+            listed = 0
+            async for batch in iter_match_ids(session, cluster, puuid, lo, hi, count):
+                entries = [(mid, *slices[i]) for (i, _), mid in batch]
+                listed += len(entries)
+                await asyncio.to_thread(index_store.add_match_index, puuid, entries)
+                if count:
+                    continue  # the newest `count` are picked from the index below
+                fresh = [(key(mid), mid) for mid, s_lo, s_hi in entries
+                         if s_hi >= start_ts and s_lo <= end_ts and mid not in yielded]
+                yielded.update(mid for _, mid in fresh)
+                if fresh:
+                    yield fresh
+            # reached only when the whole window listed cleanly; a count-limited
+            # listing that filled up may still have stopped short of it
+            if not count or listed < count:
+                if kind in ("all", "older"):
+                    synced_from = lo if synced_from is None else min(synced_from, lo)
+                if kind in ("all", "newer"):
+                    synced_to = hi if synced_to is None else max(synced_to, hi)
+    except Exception:
+        await save_sync()  # keep the windows that did complete
+        raise
+    await save_sync()
+
+    ids = await asyncio.to_thread(index_store.get_indexed_match_ids, puuid, start_ts, end_ts, count)
+    rest = [(key(mid), mid) for mid in ids if mid not in yielded]
+    if rest:
+        yield rest
+    print(f"[RIOT] 📜 {len(yielded) + len(rest)} match IDs for {puuid} "
+          f"({len(gaps)} window(s) listed from Riot)")
+
 
 async def fetch_champion_mastery(session, region: str, puuid: str):
     url = f"https://{region}.api.riotgames.com/lol/champion-mastery/v4/champion-masteries/by-puuid/{puuid}"
-    return await _fetch_json(session, url)
+    return await cached_call(
+        f"mastery:{region}:{puuid}",
+        _fetch_json, session, url, None, 5, "champion-mastery-v4.getAllChampionMasteriesByPUUID",
+    )
 
 async def fetch_summoner_by_puuid(session, region: str, puuid: str):
     url = f"https://{region}.api.riotgames.com/lol/summoner/v4/summoners/by-puuid/{puuid}"
     headers = {"X-Riot-Token": RIOT_API_KEY}
-    async with session.get(url, headers=headers) as resp:
-        resp.raise_for_status()
-        return await resp.json()
+
+    async def get():
+        async with limiter.get(session, url, "summoner-v4.getByPUUID", headers=headers) as resp:
+            resp.raise_for_status()
+            return await resp.json()
+
+    return await cached_call(f"summoner:{region}:{puuid}", flights.do, url, get)
 
 async def fetch_rank_by_puuid(session, region: str, puuid: str):
     url = f"https://{region}.api.riotgames.com/lol/league/v4/entries/by-puuid/{puuid}"
     headers = {"X-Riot-Token": RIOT_API_KEY}
-    async with session.get(url, headers=headers) as resp:
-        resp.raise_for_status()
-        data = await resp.json()
-        # return most relevant solo queue rank
-        for entry in data:
-            if entry["queueType"] == "RANKED_SOLO_5x5":
-                return f"{entry['tier'].title()} {entry['rank']}"
-        return "Unranked"
+
+    async def get():
+        async with limiter.get(session, url, "league-v4.getLeagueEntriesByPUUID", headers=headers) as resp:
+            resp.raise_for_status()
+            return await resp.json()
+
+    data = await cached_call(f"rank:{region}:{puuid}", flights.do, url, get)
+    # return most relevant solo queue rank
+    for entry in data:
+        if entry["queueType"] == "RANKED_SOLO_5x5":
+            return f"{entry['tier'].title()} {entry['rank']}"
+    return "Unranked"
@@ -1,130 +1,618 @@
 import asyncio
-import json
 import os
+import queue
 import sqlite3
+import threading
 import time
 from aiohttp import ClientSession
-from aiolimiter import AsyncLimiter
+
+from app.services import cache as parsed_store
+from app.services import cache_codecs as codecs
+from app.services import parser
+from app.services import projection
+from app.services.http_client import http
+from app.services.rate_limiter import limiter
+from app.services.singleflight import flights
 
 RIOT_API_KEY = os.getenv("RIOT_API_KEY")
 if not RIOT_API_KEY:
     raise RuntimeError("Missing RIOT_API_KEY in environment")
 
-# Riot API limits
-RATE_LIMIT = AsyncLimiter(20, 1)     # 20 req / 1s
-LONG_LIMIT = AsyncLimiter(100, 120)  # 100 req / 2min
+# Max match/timeline pairs held in memory at once while streaming
+STREAM_CONCURRENCY = int(os.getenv("STREAM_CONCURRENCY", 20))
 
 DB_PATH = "cache.db"
-CACHE_TTL = int(os.getenv("CACHE_TTL", 6 * 3600))  # default: 6 hours
+CACHE_TTL = int(os.getenv("CACHE_TTL", 6 * 3600))  # default for keys outside CACHE_TTLS: 6 hours
+
+
+def _parse_ttls(spec: str) -> dict:
+    """'account:=3600,match:=none' -> {'account:': 3600, 'match:': None}"""
+    out = {}
+    for part in spec.split(","):
+        if "=" in part:
+            prefix, ttl = part.strip().split("=", 1)
+            out[prefix] = None if ttl.lower() == "none" else int(ttl)
+    return out
+
+
+# Per-namespace TTLs in seconds (None = never expires). Finished matches and
+# timelines never change, so only profile-style lookups go stale.
+CACHE_TTLS = {
+    "match:": None,
+    "timeline:": None,
+    "raw:": None,
+    "account:": 24 * 3600,
+    "summoner:": 3600,
+    "rank:": 3600,
+    "mastery:": 3600,
+    **_parse_ttls(os.getenv("CACHE_TTLS", "")),
+}
+
+# Size bound: past CACHE_MAX_BYTES of live pages, evict down to the low watermark
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", 2 * 1024 ** 3))
+CACHE_EVICT_TO = float(os.getenv("CACHE_EVICT_TO", 0.9))
+CACHE_EVICTION = os.getenv("CACHE_EVICTION", "lru")  # lru | lfu
+CACHE_EVICT_CHUNK = 500
+
+# Background writer batching: flush after this many writes or this many seconds
+CACHE_WRITE_BATCH = int(os.getenv("CACHE_WRITE_BATCH", 200))
+CACHE_FLUSH_INTERVAL = float(os.getenv("CACHE_FLUSH_INTERVAL", 0.5))
+# Matches decoded per committed chunk when indexing an existing cache by participant
+CACHE_BACKFILL_CHUNK = int(os.getenv("CACHE_BACKFILL_CHUNK", 500))
+
+_DELETED = object()
+
+
+def _participant_rows(match_id: str, match: dict) -> list[tuple]:
+    """(match_id, puuid, end_ts, queue) for every participant of a match-v5 payload."""
+    info = match.get("info") or {}
+    end = info.get("gameEndTimestamp")
+    end_ts = end // 1000 if isinstance(end, int) else None
+    queue_id = info.get("queueId")
+    participants = (match.get("metadata") or {}).get("participants") or []
+    return [(match_id, puuid, end_ts, queue_id) for puuid in participants if isinstance(puuid, str)]
+
+
+def ttl_for(key: str) -> int | None:
+    for prefix, ttl in CACHE_TTLS.items():
+        if key.startswith(prefix):
+            return ttl
+    return CACHE_TTL
 
 # --------------------------------------------------------------------
-# SQLite cache helper (with TTL)
+# SQLite cache helper (per-namespace TTL + size-bounded LRU/LFU eviction)
+#
+# Non-blocking: the DB runs in WAL mode, reads use per-thread connections
+# (call aget() from async code to keep them off the event loop), and writes
+# are queued to a background writer thread that encodes (see cache_codecs.py) and
+# commits them in batches. Queued writes stay visible to get() until they are flushed.
+# Hits (hit count + last access) are summed in memory and written by the writer
+# in one executemany per batch, at least every CACHE_FLUSH_INTERVAL.
+# The writer also evicts least-recently (or least-frequently) used rows once
+# the live database size passes CACHE_MAX_BYTES.
+# Cached matches are also indexed by participant (match_participants), kept in
+# step with the cache table by the writer and a delete trigger, so cross-player
+# queries never have to decode match payloads.
 # --------------------------------------------------------------------
 class CacheDB:
-    def __init__(self, path=DB_PATH):
-        self.conn = sqlite3.connect(path, check_same_thread=False)
-        self.conn.execute("""
+    def __init__(self, path=DB_PATH, max_bytes: int = CACHE_MAX_BYTES, eviction: str = CACHE_EVICTION):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.eviction = eviction
+        self._local = threading.local()
+        self._pending: dict = {}
+        self._pending_lock = threading.Lock()
+        self._touches: dict[str, list] = {}  # key -> [hits, last_access], guarded by _pending_lock
+        self._queue: queue.Queue = queue.Queue()
+        self.counters = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0, "writes": 0}
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
             CREATE TABLE IF NOT EXISTS cache (
                 key TEXT PRIMARY KEY,
                 data TEXT,
-                ts REAL
+                ts REAL,
+                codec TEXT,
+                hits INTEGER DEFAULT 0,
+                last_access REAL
+            )
+        """)
+        # older databases: rows without a codec are plain json.dumps text,
+        # rows without access stats count as last used when written
+        cols = {r[1] for r in conn.execute("PRAGMA table_info(cache)")}
+        if "codec" not in cols:
+            conn.execute("ALTER TABLE cache ADD COLUMN codec TEXT")
+        if "hits" not in cols:
+            conn.execute("ALTER TABLE cache ADD COLUMN hits INTEGER DEFAULT 0")
+        if "last_access" not in cols:
+            conn.execute("ALTER TABLE cache ADD COLUMN last_access REAL")
+            conn.execute("UPDATE cache SET last_access = ts")
+        if self.eviction == "lfu":
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_lfu ON cache (hits, last_access)")
+        else:
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_lru ON cache (last_access)")
+
+        conn.execute("CREATE TABLE IF NOT EXISTS cache_meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS match_participants (
+                match_id TEXT NOT NULL,
+                puuid TEXT NOT NULL,
+                end_ts INTEGER,
+                queue INTEGER,
+                PRIMARY KEY (match_id, puuid)
             )
         """)
-        self.conn.commit()
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_participants_puuid ON match_participants (puuid, queue, end_ts)")
+        # evicted / expired / deleted matches leave the index with their row
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_cache_match_deleted AFTER DELETE ON cache
+            WHEN old.key LIKE 'match:%'
+            BEGIN
+                DELETE FROM match_participants WHERE match_id = substr(old.key, 7);
+            END
+        """)
+        conn.commit()
+
+        self._writer = threading.Thread(target=self._writer_loop, name="cache-writer", daemon=True)
+        self._writer.start()
+        # Existing databases: index the matches already cached, once, on a thread of its
+        # own in short chunks (the writer stays free); resumes after a restart
+        self.participants_ready = threading.Event()
+        self.backfill = {"status": "done", "indexed": 0, "skipped": 0}
+        if conn.execute("SELECT 1 FROM cache_meta WHERE key='participants_indexed'").fetchone():
+            self.participants_ready.set()
+        else:
+            self.backfill["status"] = "building"
+            threading.Thread(target=self._backfill_participants, name="cache-backfill", daemon=True).start()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name: str, n: int = 1):
+        with self._pending_lock:
+            self.counters[name] += n
 
     def get(self, key: str):
         """Return cached item if still fresh, else None."""
-        cur = self.conn.cursor()
-        cur.execute("SELECT data, ts FROM cache WHERE key=?", (key,))
-        row = cur.fetchone()
+        with self._pending_lock:
+            pending = self._pending.get(key)
+        if pending is _DELETED:
+            self._count("misses")
+            return None
+        if pending is not None:
+            self._count("hits")
+            return pending
+
+        row = self._conn().execute("SELECT data, ts, codec FROM cache WHERE key=?", (key,)).fetchone()
         if not row:
+            self._count("misses")
             return None
 
-        data, ts = row
-        if time.time() - ts > CACHE_TTL:
+        data, ts, codec = row
+        ttl = ttl_for(key)
+        now = time.time()
+        if ttl is not None and now - ts > ttl:
             print(f"[CACHE] ⏳ Expired: {key}")
+            self._count("expired")
+            self._count("misses")
             self.delete(key)
             return None
 
-        return json.loads(data)
+        try:
+            value = codecs.decode(codec, data)
+        except Exception as e:
+            print(f"[CACHE] ⚠️ Undecodable row {key} ({codec}): {e}")
+            self._count("misses")
+            return None
+
+        with self._pending_lock:
+            self.counters["hits"] += 1
+            touch = self._touches.get(key)
+            if touch:
+                touch[0] += 1
+                touch[1] = now
+            else:
+                self._touches[key] = [1, now]
+        return value
+
+    async def aget(self, key: str):
+        """get() on a worker thread, so the disk read and JSON decode don't stall the loop."""
+        with self._pending_lock:
+            pending = self._pending.get(key)
+        if pending is not None:
+            self._count("misses" if pending is _DELETED else "hits")
+            return None if pending is _DELETED else pending
+        return await asyncio.to_thread(self.get, key)
 
     def set(self, key: str, data: dict):
-        """Store item with current timestamp."""
-        self.conn.execute(
-            "REPLACE INTO cache (key, data, ts) VALUES (?, ?, ?)",
-            (key, json.dumps(data), time.time())
-        )
-        self.conn.commit()
+        """Queue item for storage with current timestamp."""
+        with self._pending_lock:
+            self._pending[key] = data
+        self._queue.put(("set", key, data, time.time()))
 
     def delete(self, key: str):
-        """Delete one cache entry."""
-        self.conn.execute("DELETE FROM cache WHERE key=?", (key,))
-        self.conn.commit()
+        """Queue deletion of one cache entry."""
+        with self._pending_lock:
+            self._pending[key] = _DELETED
+        self._queue.put(("delete", key, _DELETED, None))
 
     def cleanup_expired(self):
-        """Delete all expired rows."""
-        threshold = time.time() - CACHE_TTL
-        self.conn.execute("DELETE FROM cache WHERE ts < ?", (threshold,))
-        self.conn.commit()
-        print("[CACHE] 🧹 Cleaned up expired entries")
+        """Queue deletion of all expired rows (per-namespace TTLs)."""
+        self._queue.put(("cleanup", None, None, time.time()))
+
+    def flush(self):
+        """Block until every queued write (and recorded hit) has been committed."""
+        self._queue.put(("sync", None, None, None))
+        self._queue.join()
+
+    def used_bytes(self, conn: sqlite3.Connection | None = None) -> int:
+        """Live (non-free) database pages, in bytes."""
+        conn = conn or self._conn()
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        return (page_count - free) * page_size
+
+    def stats(self) -> dict:
+        with self._pending_lock:
+            counters = dict(self.counters)
+            pending = len(self._pending)
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            **counters,
+            "hit_rate": round(counters["hits"] / lookups, 3) if lookups else 0.0,
+            "pending_writes": pending,
+            "used_bytes": self.used_bytes(),
+            "max_bytes": self.max_bytes,
+            "eviction": self.eviction,
+        }
+
+    def _writer_loop(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        while True:
+            try:
+                batch = [self._queue.get(timeout=CACHE_FLUSH_INTERVAL)]
+            except queue.Empty:
+                # idle: still write out the hits recorded meanwhile
+                try:
+                    self._apply_touches(conn)
+                except Exception as e:
+                    print(f"[CACHE] ⚠️ Writing hit stats failed: {e}")
+                continue
+            deadline = time.monotonic() + CACHE_FLUSH_INTERVAL
+            while len(batch) < CACHE_WRITE_BATCH:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self._apply(conn, batch)
+                self._evict(conn)
+            except Exception as e:
+                print(f"[CACHE] ⚠️ Write batch failed: {e}")
+            finally:
+                with self._pending_lock:
+                    for op, key, data, _ in batch:
+                        if op in ("set", "delete") and self._pending.get(key) is data:
+                            del self._pending[key]
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _apply_touches(self, conn: sqlite3.Connection):
+        with self._pending_lock:
+            touches, self._touches = self._touches, {}
+        if touches:
+            with conn:
+                conn.executemany(
+                    "UPDATE cache SET hits = hits + ?, last_access = ? WHERE key=?",
+                    [(n, last, key) for key, (n, last) in touches.items()],
+                )
+
+    def _apply(self, conn: sqlite3.Connection, batch: list):
+        self._apply_touches(conn)
+        with conn:
+            for op, key, data, arg in batch:
+                if op == "set":
+                    codec = codecs.for_key(key)
+                    conn.execute(
+                        "REPLACE INTO cache (key, data, ts, codec, hits, last_access) VALUES (?, ?, ?, ?, 0, ?)",
+                        (key, codec.encode(data), arg, codec.name, arg)
+                    )
+                    self._count("writes")
+                    if key.startswith("match:") and isinstance(data, dict):
+                        conn.executemany(
+                            "INSERT OR REPLACE INTO match_participants (match_id, puuid, end_ts, queue) "
+                            "VALUES (?, ?, ?, ?)",
+                            _participant_rows(key[len("match:"):], data),
+                        )
+                elif op == "delete":
+                    conn.execute("DELETE FROM cache WHERE key=?", (key,))
+                elif op == "cleanup":
+                    self._cleanup(conn, arg)
+
+    def _backfill_participants(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        try:
+            row = conn.execute("SELECT value FROM cache_meta WHERE key='participants_cursor'").fetchone()
+            last = row[0] if row else "match:"
+            while True:
+                rows = conn.execute(
+                    # "match;" is the first key past the match: namespace
+                    "SELECT key, data, codec FROM cache WHERE key > ? AND key < 'match;' ORDER BY key LIMIT ?",
+                    (last, CACHE_BACKFILL_CHUNK),
+                ).fetchall()
+                if not rows:
+                    break
+                params = []
+                for key, data, codec in rows:
+                    try:
+                        match = codecs.decode(codec, data)
+                        params += [(*r, key) for r in _participant_rows(key[len("match:"):], match)]
+                        self.backfill["indexed"] += 1
+                    except Exception:
+                        self.backfill["skipped"] += 1
+                last = rows[-1][0]
+                with conn:
+                    # skip matches deleted since they were read, so the index can't outlive them
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO match_participants (match_id, puuid, end_ts, queue) "
+                        "SELECT ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM cache WHERE key = ?)",
+                        params,
+                    )
+                    conn.execute("REPLACE INTO cache_meta (key, value) VALUES ('participants_cursor', ?)", (last,))
+            with conn:
+                conn.execute("REPLACE INTO cache_meta (key, value) VALUES ('participants_indexed', ?)", (time.time(),))
+                conn.execute("DELETE FROM cache_meta WHERE key='participants_cursor'")
+            self.backfill["status"] = "done"
+            print(f"[CACHE] 🗂️ Indexed participants of {self.backfill['indexed']} cached matches "
+                  f"({self.backfill['skipped']} unreadable)")
+        except Exception as e:
+            # the marker isn't written: the next start resumes from the cursor
+            self.backfill["status"] = f"failed: {e}"
+            print(f"[CACHE] ⚠️ Participant index backfill failed: {e}")
+        finally:
+            conn.close()
+            self.participants_ready.set()
+
+    def participant_counts(self, min_matches: int = 1, queue: int | None = None,
+                           limit: int = 100, offset: int = 0) -> tuple[int, list[dict]]:
+        """
+        Players by number of cached matches (most first), from the participant index.
+        Returns (number of players with >= min_matches, one page of
+        {puuid, num_matches, example_match, last_end_ts}).
+        """
+        where, params = ("WHERE queue = ?", (queue,)) if queue is not None else ("", ())
+        grouped = f"FROM match_participants {where} GROUP BY puuid HAVING COUNT(*) >= ?"
+        conn = self._conn()
+        total = conn.execute(f"SELECT COUNT(*) FROM (SELECT puuid {grouped})", (*params, min_matches)).fetchone()[0]
+        cur = conn.execute(
+            f"SELECT puuid, COUNT(*) AS n, MAX(match_id), MAX(end_ts) {grouped} "
+            "ORDER BY n DESC, puuid LIMIT ? OFFSET ?",
+            (*params, min_matches, limit, offset),
+        )
+        players = [
+            {"puuid": puuid, "num_matches": n, "example_match": example, "last_end_ts": last_end}
+            for puuid, n, example, last_end in cur
+        ]
+        return total, players
+
+    def _cleanup(self, conn: sqlite3.Connection, now: float):
+        removed = 0
+        for prefix, ttl in CACHE_TTLS.items():
+            if ttl is not None:
+                cur = conn.execute(
+                    "DELETE FROM cache WHERE key LIKE ? AND ts < ?", (prefix + "%", now - ttl)
+                )
+                removed += cur.rowcount
+        # keys outside every namespace fall back to CACHE_TTL
+        known = " AND ".join("key NOT LIKE ?" for _ in CACHE_TTLS) or "1"
+        cur = conn.execute(
+            f"DELETE FROM cache WHERE ts < ? AND {known}",
+            (now - CACHE_TTL, *(p + "%" for p in CACHE_TTLS)),
+        )
+        removed += cur.rowcount
+        self._count("expired", removed)
+        print(f"[CACHE] 🧹 Cleaned up {removed} expired entries")
+
+    def _evict(self, conn: sqlite3.Connection):
+        used = self.used_bytes(conn)
+        if used <= self.max_bytes:
+            return
+        target = self.max_bytes * CACHE_EVICT_TO
+        order = "hits ASC, last_access ASC" if self.eviction == "lfu" else "last_access ASC"
+        evicted = 0
+        while used > target:
+            # size the chunk from the average row, so one pass lands near the watermark
+            rows = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+            n = min(CACHE_EVICT_CHUNK, max(1, int(rows * (used - target) / used) + 1))
+            with conn:
+                cur = conn.execute(
+                    f"DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY {order} LIMIT ?)",
+                    (n,),
+                )
+            if not cur.rowcount:
+                break
+            evicted += cur.rowcount
+            used = self.used_bytes(conn)
+        self._count("evicted", evicted)
+        print(f"[CACHE] ♻️ Evicted {evicted} entries ({self.eviction}), {used / 1e6:.1f} MB in use")
 
 cache = CacheDB()
 
 # --------------------------------------------------------------------
 # Riot fetcher functions
 # --------------------------------------------------------------------
-async def _fetch_json(session: ClientSession, url: str):
-    """Fetch JSON with built-in rate limiting and retries."""
-    async with RATE_LIMIT, LONG_LIMIT:
-        for attempt in range(3):
-            try:
-                headers = {"X-Riot-Token": RIOT_API_KEY}
-                async with session.get(url, headers=headers, timeout=20) as resp:
-                    if resp.status == 429:
-                        await asyncio.sleep(2)
-                        continue
-                    resp.raise_for_status()
-                    return await resp.json()
-            except Exception as e:
-                if attempt == 2:
-                    print(f"[RIOT_FETCHER] ❌ Failed: {url} ({e})")
-                    raise
-                await asyncio.sleep(1)
+async def _fetch_json(session: ClientSession, url: str, method: str):
+    """Fetch JSON through the shared Riot rate limiter, with retries."""
+    for attempt in range(3):
+        try:
+            headers = {"X-Riot-Token": RIOT_API_KEY}
+            async with limiter.get(session, url, method, headers=headers, timeout=20) as resp:
+                resp.raise_for_status()
+                return await resp.json()
+        except Exception as e:
+            if attempt == 2:
+                print(f"[RIOT_FETCHER] ❌ Failed: {url} ({e})")
+                raise
+            await asyncio.sleep(1)
+
+def _store(key: str, data: dict) -> dict:
+    """Cache a payload, projected down to the parser's schema when enabled; returns what was stored."""
+    if projection.CACHE_RAW_ARCHIVE:
+        cache.set(f"raw:{key}", data)
+    project = projection.for_key(key)
+    if project:
+        data = project(data)
+    cache.set(key, data)
+    return data
+
+async def _cache_lookup(key: str):
+    """Cached payload for `key`; stale projections are rebuilt from the raw archive or treated as a miss."""
+    cached = await cache.aget(key)
+    if cached and projection.is_current(cached):
+        return cached
+    if cached and projection.CACHE_RAW_ARCHIVE:
+        raw = await cache.aget(f"raw:{key}")
+        if raw:
+            print(f"[CACHE] ♻️ Re-projected {key} from raw archive")
+            return _store(key, raw)
+    return None
+
+async def _fetch_and_cache(session: ClientSession, url: str, method: str, key: str):
+    """Cache-miss path, shared by concurrent callers through the single-flight layer."""
+    data = await _fetch_json(session, url, method)
+    return _store(key, data)
+
+async def cached_call(key: str, fn, *args):
+    """Serve `key` from the cache (namespace TTL applies), else await fn(*args) and cache the result."""
+    cached = await cache.aget(key)
+    if cached is not None:
+        return cached
+    data = await fn(*args)
+    if data is not None:
+        cache.set(key, data)
+    return data
 
 async def fetch_match(session: ClientSession, cluster: str, match_id: str):
     """Fetch match data (with caching)."""
     key = f"match:{match_id}"
-    cached = cache.get(key)
+    cached = await _cache_lookup(key)
     if cached:
         print(f"[CACHE] ✅ Match hit {match_id}")
         return cached
 
     url = f"https://{cluster}.api.riotgames.com/lol/match/v5/matches/{match_id}"
-    data = await _fetch_json(session, url)
-    cache.set(key, data)
-    return data
+    return await flights.do(key, _fetch_and_cache, session, url, "match-v5.getMatch", key)
 
 async def fetch_timeline(session: ClientSession, cluster: str, match_id: str):
     """Fetch timeline data (with caching)."""
     key = f"timeline:{match_id}"
-    cached = cache.get(key)
+    cached = await _cache_lookup(key)
     if cached:
         print(f"[CACHE] ✅ Timeline hit {match_id}")
         return cached
     url = f"https://{cluster}.api.riotgames.com/lol/match/v5/matches/{match_id}/timeline"
-    data = await _fetch_json(session, url)
-    cache.set(key, data)
-    return data
+    return await flights.do(key, _fetch_and_cache, session, url, "match-v5.getTimeline", key)
+
+async def fetch_match_with_timeline(session: ClientSession, cluster: str, match_id: str, include_timeline=True):
+    """Fetch one match and (optionally) its timeline side by side."""
+    if not include_timeline:
+        return await fetch_match(session, cluster, match_id), None
+    return await asyncio.gather(
+        fetch_match(session, cluster, match_id),
+        fetch_timeline(session, cluster, match_id),
+    )
+
+async def stream_matches(cluster: str, match_ids, puuid: str, include_timeline=True,
+                         concurrency: int = STREAM_CONCURRENCY, session: ClientSession | None = None):
+    """
+    Fetch and parse matches as a pipeline, yielding (match_id, stats) as each one completes.
+
+    `match_ids` is a list, or an async iterator of ID batches (e.g. pages from
+    riot_api.iter_match_ids) — each batch starts fetching as soon as it arrives.
+
+    Matches already in the parsed-match store (at the current PARSER_VERSION) are
+    yielded straight from there without loading the raw match or timeline. The rest
+    are fetched together with their timeline and handed straight to the parser, so
+    the raw JSON is dropped as soon as it is parsed and at most `concurrency` raw
+    payloads are alive at once. Results arrive in completion order; failed fetches
+    yield (match_id, exception).
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    sem = asyncio.Semaphore(concurrency)
+    tasks: list[asyncio.Task] = []
+    fed = {"count": 0, "done": False}
+    session = session or http.session
+
+    async def worker(mid: str):
+        async with sem:
+            try:
+                match, timeline = await fetch_match_with_timeline(session, cluster, mid, include_timeline)
+                if include_timeline:
+                    # one timeline walk covers all ten participants; store every row so
+                    # friends in the same game become a lookup
+                    rows = parser.extract_match_stats(match, timeline)
+                    del match, timeline
+                    if rows:
+                        await asyncio.to_thread(parsed_store.set_parsed_matches, mid, rows, parser.PARSER_VERSION)
+                    stats = rows.get(puuid)
+                else:
+                    # rows parsed without a timeline are incomplete, keep them out of the store
+                    stats = parser.extract_stats(match, timeline, puuid)
+                    del match, timeline
+            except Exception as e:
+                stats = e
+        await queue.put((mid, stats))
+
+    async def feed():
+        seen = set()
+        try:
+            async for batch in _batches(match_ids):
+                batch = [mid for mid in batch if mid not in seen]
+                seen.update(batch)
+                stored = await asyncio.to_thread(
+                    parsed_store.get_parsed_matches, batch, puuid, parser.PARSER_VERSION
+                )
+                if stored:
+                    print(f"[CACHE] ✅ {len(stored)} parsed matches hit for {puuid}")
+                for mid in batch:
+                    if mid in stored:
+                        queue.put_nowait((mid, stored[mid]))
+                    else:
+                        tasks.append(asyncio.create_task(worker(mid)))
+                fed["count"] += len(batch)
+        finally:
+            fed["done"] = True
+            queue.put_nowait(None)  # wake the consumer to re-check completion
 
-async def fetch_matches_concurrent(cluster: str, match_ids: list[str], include_timeline=False):
-    """Fetch many matches concurrently with rate limiting and caching."""
-    async with ClientSession() as session:
-        tasks = [fetch_match(session, cluster, mid) for mid in match_ids]
-        matches = await asyncio.gather(*tasks, return_exceptions=True)
+    feeder = asyncio.create_task(feed())
+    try:
+        received = 0
+        while not fed["done"] or received < fed["count"]:
+            item = await queue.get()
+            if item is None:
+                continue
+            received += 1
+            yield item
+        await feeder  # surface an ID-listing failure
+    finally:
+        feeder.cancel()
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(feeder, *tasks, return_exceptions=True)
 
-        if include_timeline:
-            timeline_tasks = [fetch_timeline(session, cluster, mid) for mid in match_ids]
-            timelines = await asyncio.gather(*timeline_tasks, return_exceptions=True)
-            return list(zip(matches, timelines))
 
-        return matches
+async def _batches(match_ids):
+    if isinstance(match_ids, (list, tuple)):
+        yield list(match_ids)
+    else:
+        async for batch in match_ids:
+            yield batch
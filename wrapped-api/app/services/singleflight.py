@@ -0,0 +1,40 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    In-process request coalescing: concurrent calls with the same key share one
+    in-flight coroutine instead of each hitting Riot. Nothing is cached once the
+    call finishes — that is the cache layers' job.
+    """
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.stats = {"calls": 0, "executed": 0, "coalesced": 0}
+
+    async def do(self, key: str, fn, *args, **kwargs):
+        """Run `await fn(*args, **kwargs)` once per key at a time; other callers await the same result."""
+        self.stats["calls"] += 1
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.stats["coalesced"] += 1
+            # shield so one waiter being cancelled doesn't cancel the shared call
+            return await asyncio.shield(fut)
+
+        self.stats["executed"] += 1
+        fut = asyncio.ensure_future(fn(*args, **kwargs))
+        self._inflight[key] = fut
+        fut.add_done_callback(lambda f: self._release(key, f))
+        return await asyncio.shield(fut)
+
+    def _release(self, key: str, fut: asyncio.Future):
+        if self._inflight.get(key) is fut:
+            del self._inflight[key]
+        if not fut.cancelled():
+            fut.exception()  # mark retrieved; waiters already got it
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "inflight": len(self._inflight)}
+
+
+flights = SingleFlight()
@@ -0,0 +1,122 @@
+import gzip
+import hashlib
+import json
+import os
+
+try:
+    import brotli
+except ImportError:  # optional: br is simply not offered
+    brotli = None
+
+from fastapi import Request
+from fastapi.responses import Response
+
+# --------------------------------------------------------------------
+# Pre-encoded JSON payloads
+#
+# Cached wrapped results are kept as bytes: gzip is the stored form (in
+# DynamoDB and the hot tier), the raw body and brotli are derived lazily.
+# Cache hits are answered with whichever encoding the client accepts,
+# without decoding and re-serializing the JSON.
+# --------------------------------------------------------------------
+GZIP_LEVEL = int(os.getenv("WRAPPED_GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("WRAPPED_BROTLI_QUALITY", 5))
+# Cached results only change when regenerated; let browsers / nginx / a CDN
+# keep them briefly and revalidate with If-None-Match afterwards
+CACHE_CONTROL = os.getenv("WRAPPED_CACHE_CONTROL", "public, max-age=300, stale-while-revalidate=60")
+
+
+def _dumps(obj) -> bytes:
+    # same body JSONResponse would render
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def accepted_encodings(request: Request) -> set[str]:
+    out = set()
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name and params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            out.add(name.lower())
+    return out
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Weak If-None-Match comparison (W/ prefixes ignored, `*` matches anything)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    bare = etag.removeprefix("W/")
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == bare:
+            return True
+    return False
+
+
+class EncodedPayload:
+    """
+    A JSON document held as bytes, with gzip/br variants and a content-hash ETag.
+    `updated_at` is when the stored copy was written (unix seconds), if known.
+    """
+
+    __slots__ = ("_raw", "_gzip", "_br", "_etag", "updated_at")
+
+    def __init__(self, raw: bytes | None = None, gz: bytes | None = None, etag: str | None = None,
+                 updated_at: int | None = None):
+        if raw is None and gz is None:
+            raise ValueError("EncodedPayload needs raw or gzip bytes")
+        self._raw = raw
+        self._gzip = gz
+        self._br = None
+        self._etag = etag
+        self.updated_at = updated_at
+
+    @classmethod
+    def from_obj(cls, obj) -> "EncodedPayload":
+        return cls(raw=_dumps(obj))
+
+    @property
+    def raw(self) -> bytes:
+        if self._raw is None:
+            self._raw = gzip.decompress(self._gzip)
+        return self._raw
+
+    @property
+    def gzip(self) -> bytes:
+        if self._gzip is None:
+            # mtime=0 keeps the bytes deterministic for identical content
+            self._gzip = gzip.compress(self.raw, compresslevel=GZIP_LEVEL, mtime=0)
+        return self._gzip
+
+    @property
+    def br(self) -> bytes | None:
+        if self._br is None and brotli is not None:
+            self._br = brotli.compress(self.raw, quality=BROTLI_QUALITY)
+        return self._br
+
+    @property
+    def etag(self) -> str:
+        if self._etag is None:
+            self._etag = 'W/"' + hashlib.sha256(self.raw).hexdigest()[:32] + '"'
+        return self._etag
+
+    def obj(self):
+        return json.loads(self.raw)
+
+    def response(self, request: Request, status_code: int = 200, headers: dict | None = None,
+                 cache_control: str = CACHE_CONTROL) -> Response:
+        """
+        Serve the best encoding the client accepts (br > gzip > identity), or a
+        304 when If-None-Match already has this ETag — checked before any decoding.
+        """
+        headers = {"ETag": self.etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding", **(headers or {})}
+        if etag_matches(request, self.etag):
+            return Response(status_code=304, headers=headers)
+        accepted = accepted_encodings(request)
+        if "br" in accepted and self.br is not None:
+            body, headers["Content-Encoding"] = self.br, "br"
+        elif "gzip" in accepted:
+            body, headers["Content-Encoding"] = self.gzip, "gzip"
+        else:
+            body = self.raw
+        return Response(body, status_code=status_code, media_type="application/json", headers=headers)
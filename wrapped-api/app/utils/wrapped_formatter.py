@@ -70,9 +70,11 @@ def process_wrapped_output(data: dict) -> dict:
     ]
 
     # 🐉 Objectives with detailed dragon info
+    # (no breakdown when some games had no timeline: count from the end-of-game counter)
     dragons_total = champ_summary.get("dragon_breakdown", {})
+    detail = params.get("detail", "full")
     objectives = {
-        "Dragons": int(sum(dragons_total.values())),
+        "Dragons": int(sum(dragons_total.values()) if dragons_total is not None else global_summary.get("dragons", 0)),
         "Barons": int(global_summary.get("barons", 0)),
         "Heralds": int(global_summary.get("riftHeralds", 0)),
         "TurretPlates": int(global_summary.get("turretPlates", 0)),
@@ -152,6 +154,8 @@ def process_wrapped_output(data: dict) -> dict:
         "controlWardsPlaced", "wardsPlaced", "wardsKilled", "firstBloods"
     }
     other_stats = {k: v for k, v in global_summary.items() if k not in used_fields}
+    # timeline-only stats that weren't computed (null above), listed for the frontend
+    unavailable = sorted(k for k, v in {**other_stats, "DragonTypes": dragons_total}.items() if v is None)
 
     dpm = global_summary.get("DamagePerMinute") or global_summary.get("damagePerMinute")
     if not dpm:
@@ -164,6 +168,8 @@ def process_wrapped_output(data: dict) -> dict:
         "SummonerLevel": data.get("summoner_level", 0),
         "Rank": data.get("rank", "Unranked"),
         "Region": params.get("region", ""),
+        "Detail": detail,
+        "Unavailable": unavailable,
         "TimePlayed": time_played,
         "KDA": kda,
         "WinRate": global_summary.get("win_rate", 0),